@@ -19,6 +19,8 @@ import yaml
 import pytz
 
 from add_existing_baseyear import add_build_year_to_new_assets
+from component_index import get_component_index, contains
+from network_io import export_network, input_series, load_network
 
 #First tell PyPSA that links can have multiple outputs by
 #overriding the component_attrs. This can be done for
@@ -40,10 +42,17 @@ override_component_attrs["Generator"].loc["lifetime"] = ["float","years",np.nan,
 override_component_attrs["Store"].loc["build_year"] = ["integer","year",np.nan,"build year","Input (optional)"]
 override_component_attrs["Store"].loc["lifetime"] = ["float","years",np.nan,"build year","Input (optional)"]
 
-def add_brownfield(n, n_p, year):
+# the components of the previous network copied by add_brownfield, with
+# the buses and carriers they refer to
+brownfield_components = ["Bus", "Carrier", "Link", "Generator", "Store"]
+
+def add_brownfield(n, n_p, year, threshold_capacity=None):
 
     print("adding brownfield")
 
+    if threshold_capacity is None:
+        threshold_capacity = snakemake.config['existing_capacities']['threshold_capacity']
+
     for c in n_p.iterate_components(["Link", "Generator", "Store"]):
 
         attr = "e" if c.name == "Store" else "p"
@@ -59,12 +68,13 @@ def add_brownfield(n, n_p, year):
 
         #remove assets if their optimized nominal capacity is lower than a threshold
         #since CHP heat Link is proportional to CHP electric Link, make sure threshold is compatible
-        chp_heat = c.df.index[c.df[attr + "_nom_extendable"] & c.df.index.str.contains("urban central") & c.df.index.str.contains("CHP") & c.df.index.str.contains("heat")]
+        index = get_component_index(n_p, c.name)
+        chp_heat = c.df.index[c.df[attr + "_nom_extendable"] & (index.heat_system == "urban central") & contains(index.technology, "CHP", "heat")]
         if not chp_heat.empty:
             n_p.mremove(c.name,
-                        chp_heat[c.df.loc[chp_heat, attr + "_nom_opt"] < snakemake.config['existing_capacities']['threshold_capacity']*c.df.efficiency[chp_heat.str.replace("heat","electric")].values*c.df.p_nom_ratio[chp_heat.str.replace("heat","electric")].values/c.df.efficiency[chp_heat].values])
+                        chp_heat[c.df.loc[chp_heat, attr + "_nom_opt"] < threshold_capacity*c.df.efficiency[chp_heat.str.replace("heat","electric")].values*c.df.p_nom_ratio[chp_heat.str.replace("heat","electric")].values/c.df.efficiency[chp_heat].values])
         n_p.mremove(c.name,
-                    c.df.index[c.df[attr + "_nom_extendable"] & ~c.df.index.isin(chp_heat) & (c.df[attr + "_nom_opt"] < snakemake.config['existing_capacities']['threshold_capacity'])])
+                    c.df.index[c.df[attr + "_nom_extendable"] & ~c.df.index.isin(chp_heat) & (c.df[attr + "_nom_opt"] < threshold_capacity)])
 
         #copy over assets but fix their capacity
         c.df[attr + "_nom"] = c.df[attr + "_nom_opt"]
@@ -106,14 +116,15 @@ if __name__ == "__main__":
 
     year=int(snakemake.wildcards.planning_horizons)
 
-    n = pypsa.Network(snakemake.input.network,
-                      override_component_attrs=override_component_attrs)
+    n = load_network(snakemake.input.network,
+                     override_component_attrs=override_component_attrs)
 
     add_build_year_to_new_assets(n, year)
 
-    n_p = pypsa.Network(snakemake.input.network_p,
-                      override_component_attrs=override_component_attrs)
+    n_p = load_network(snakemake.input.network_p, components=brownfield_components,
+                       series=input_series(n, brownfield_components),
+                       override_component_attrs=override_component_attrs)
 #%%
     add_brownfield(n, n_p, year)
 
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0], snakemake.config['network_io'])
@@ -20,7 +20,10 @@ import pytz
 
 from vresutils.costdata import annuity
 
-from prepare_sector_network import prepare_costs
+from prepare_costs import load_costs
+from staged_network import StagedNetwork
+from component_index import get_component_index, contains, heat_systems
+from network_io import export_network, load_network
 
 #First tell PyPSA that links can have multiple outputs by
 #overriding the component_attrs. This can be done for
@@ -72,8 +75,9 @@ def add_build_year_to_new_assets(n, baseyear):
 
 def add_existing_renewables(df_agg):
     """
-    Append existing renewables to the df_agg pd.DataFrame
-    with the conventional power plants.
+    Return the df_agg pd.DataFrame with the conventional power plants
+    with the existing renewables appended, one row for the capacity
+    installed in each year at each node.
     """
 
     cc = pd.read_csv('data/Country_codes.csv',
@@ -83,6 +87,10 @@ def add_existing_renewables(df_agg):
                 "onwind" : "onwind",
                 "offwind" : "offwind-ac"}
 
+    elec_buses = n.buses.index[n.buses.carrier == "AC"].union(n.buses.index[n.buses.carrier == "DC"])
+    countries = n.buses.loc[elec_buses,"country"]
+
+    renewables = [df_agg]
     for tech in ['solar', 'onwind', 'offwind']:
         carrier = carriers[tech]
         df = pd.read_csv('data/existing_infrastructure/{}_capacity_IRENA.csv'.format(tech),
@@ -105,28 +113,30 @@ def add_existing_renewables(df_agg):
 
         #distribute capacities among nodes according to capacity factor
         #weighting with nodal_fraction
-        elec_buses = n.buses.index[n.buses.carrier == "AC"].union(n.buses.index[n.buses.carrier == "DC"])
         nodal_fraction = pd.Series(0.,elec_buses)
 
-        for country in n.buses.loc[elec_buses,"country"].unique():
-            gens = n.generators.index[(n.generators.index.str[:2] == country) & (n.generators.carrier == carrier)]
-            cfs = n.generators_t.p_max_pu[gens].mean()
-            cfs_key = cfs/cfs.sum()
-            nodal_fraction.loc[n.generators.loc[gens,"bus"]] = cfs_key.values
+        gens = n.generators.index[(n.generators.carrier == carrier) & n.generators.index.str[:2].isin(countries.unique())]
+        cfs = n.generators_t.p_max_pu[gens].mean()
+        cfs_key = cfs/cfs.groupby(gens.str[:2]).transform("sum")
+        nodal_fraction.loc[n.generators.loc[gens,"bus"]] = cfs_key.values
 
-        nodal_df = df.loc[n.buses.loc[elec_buses,"country"]]
+        nodal_df = df.loc[countries]
         nodal_df.index = elec_buses
         nodal_df = nodal_df.multiply(nodal_fraction,axis=0)
 
-        for year in nodal_df.columns:
-            for node in nodal_df.index:
-                name = f"{node}-{tech}-{year}"
-                capacity = nodal_df.loc[node,year]
-                if capacity > 0.:
-                    df_agg.at[name,"Fueltype"] = tech
-                    df_agg.at[name,"Capacity"] = capacity
-                    df_agg.at[name,"DateIn"] = year
-                    df_agg.at[name,"cluster_bus"] = node
+        #long format with the capacity installed in each year at each node
+        capacity = nodal_df.T.stack()
+        capacity = capacity[capacity > 0.]
+        year = capacity.index.get_level_values(0)
+        node = capacity.index.get_level_values(1)
+
+        renewables.append(pd.DataFrame({"Fueltype" : tech,
+                                        "Capacity" : capacity.values,
+                                        "DateIn" : year,
+                                        "cluster_bus" : node},
+                                       index=node + "-" + tech + "-" + year.astype(str)))
+
+    return pd.concat(renewables, sort=False)
 
 def add_power_capacities_installed_before_baseyear(n, grouping_years, costs, baseyear):
     """
@@ -179,15 +189,16 @@ def add_power_capacities_installed_before_baseyear(n, grouping_years, costs, bas
 
 
     #include renewables in df_agg
-    add_existing_renewables(df_agg)
+    df_agg = add_existing_renewables(df_agg)
 
     df_agg["grouping_year"] = np.take(grouping_years,
                                       np.digitize(df_agg.DateIn,
                                                   grouping_years,
                                                   right=True))
 
-    df = df_agg.pivot_table(index=["grouping_year",'Fueltype'], columns='cluster_bus',
-                            values='Capacity', aggfunc='sum')
+    #capacity in MW by grouping year, fuel type and node
+    df = df_agg.groupby(["grouping_year", "Fueltype", "cluster_bus"]).Capacity.sum().reset_index()
+    df = df[df.Capacity > snakemake.config['existing_capacities']['threshold_capacity']]
 
     carrier = {"OCGT" : "gas",
                "CCGT" : "gas",
@@ -196,45 +207,47 @@ def add_power_capacities_installed_before_baseyear(n, grouping_years, costs, bas
                "lignite" : "lignite",
                "nuclear" : "uranium"}
 
-    for grouping_year, generator in df.index:
-        #capacity is the capacity in MW at each node for this
-        capacity = df.loc[grouping_year, generator]
-        capacity = capacity[~capacity.isna()]
-        capacity = capacity[capacity > snakemake.config['existing_capacities']['threshold_capacity']]
-
-        if generator in ['solar', 'onwind', 'offwind']:
-            if generator =='offwind':
-                p_max_pu=n.generators_t.p_max_pu[capacity.index + ' offwind-ac' + '-' + str(baseyear)]
-            else:
-                p_max_pu=n.generators_t.p_max_pu[capacity.index + ' ' + generator + '-' + str(baseyear)]
-
-            n.madd("Generator",
-                   capacity.index,
-                   suffix=' ' + generator +"-"+ str(grouping_year),
-                   bus=capacity.index,
-                   carrier=generator,
-                   p_nom=capacity,
-                   marginal_cost=costs.at[generator,'VOM'],
-                   capital_cost=costs.at[generator,'fixed'],
-                   efficiency=costs.at[generator, 'efficiency'],
-                   p_max_pu=p_max_pu.rename(columns=n.generators.bus),
-                   build_year=grouping_year,
-                   lifetime=costs.at[generator,'lifetime'])
-        else:
-            n.madd("Link",
-                   capacity.index,
-                   suffix= " " + generator +"-" + str(grouping_year),
-                   bus0="EU " + carrier[generator],
-                   bus1=capacity.index,
-                   bus2="co2 atmosphere",
-                   carrier=generator,
-                   marginal_cost=costs.at[generator,'efficiency']*costs.at[generator,'VOM'], #NB: VOM is per MWel
-                   capital_cost=costs.at[generator,'efficiency']*costs.at[generator,'fixed'], #NB: fixed cost is per MWel
-                   p_nom=capacity/costs.at[generator,'efficiency'],
-                   efficiency=costs.at[generator,'efficiency'],
-                   efficiency2=costs.at[carrier[generator],'CO2 intensity'],
-                   build_year=grouping_year,
-                   lifetime=costs.at[generator,'lifetime'])
+    df.index = df.cluster_bus + " " + df.Fueltype + "-" + df.grouping_year.astype(str)
+    cost = costs.loc[df.Fueltype].set_index(df.index)
+
+    renewable_b = df.Fueltype.isin(['solar', 'onwind', 'offwind'])
+
+    ren, ren_cost = df[renewable_b], cost[renewable_b]
+    if not ren.empty:
+        #profiles of the generators of the same carrier in the base year
+        p_max_pu = n.generators_t.p_max_pu[ren.cluster_bus + " " + ren.Fueltype.replace("offwind", "offwind-ac")
+                                           + "-" + str(baseyear)]
+        p_max_pu.columns = ren.index
+
+        n.madd("Generator",
+               ren.index,
+               bus=ren.cluster_bus,
+               carrier=ren.Fueltype,
+               p_nom=ren.Capacity,
+               marginal_cost=ren_cost['VOM'],
+               capital_cost=ren_cost['fixed'],
+               efficiency=ren_cost['efficiency'],
+               p_max_pu=p_max_pu,
+               build_year=ren.grouping_year,
+               lifetime=ren_cost['lifetime'])
+
+    conv, conv_cost = df[~renewable_b], cost[~renewable_b]
+    if not conv.empty:
+        fuel = conv.Fueltype.map(carrier)
+
+        n.madd("Link",
+               conv.index,
+               bus0="EU " + fuel,
+               bus1=conv.cluster_bus,
+               bus2="co2 atmosphere",
+               carrier=conv.Fueltype,
+               marginal_cost=conv_cost['efficiency']*conv_cost['VOM'], #NB: VOM is per MWel
+               capital_cost=conv_cost['efficiency']*conv_cost['fixed'], #NB: fixed cost is per MWel
+               p_nom=conv.Capacity/conv_cost['efficiency'],
+               efficiency=conv_cost['efficiency'],
+               efficiency2=pd.Series(costs.loc[fuel, 'CO2 intensity'].values, conv.index),
+               build_year=conv.grouping_year,
+               lifetime=conv_cost['lifetime'])
 
 
 def add_heating_capacities_installed_before_baseyear(n, baseyear, grouping_years, ashp_cop, gshp_cop, time_dep_hp_cop, costs, default_lifetime):
@@ -303,25 +316,35 @@ def add_heating_capacities_installed_before_baseyear(n, baseyear, grouping_years
 
     # split existing capacities between residential and services
     # proportional to energy demand
-    ratio_residential=pd.Series([(n.loads_t.p_set.sum()['{} residential rural heat'.format(node)] /
-               (n.loads_t.p_set.sum()['{} residential rural heat'.format(node)] +
-                n.loads_t.p_set.sum()['{} services rural heat'.format(node)] ))
-                   for node in nodal_df.index], index=nodal_df.index)
+    heat_demand = n.loads_t.p_set.sum()
+    residential = heat_demand[nodal_df.index + ' residential rural heat'].values
+    services = heat_demand[nodal_df.index + ' services rural heat'].values
+    ratio_residential = pd.Series(residential/(residential + services), index=nodal_df.index)
 
     for tech in techs:
         nodal_df['residential ' + tech] = nodal_df[tech]*ratio_residential
         nodal_df['services ' + tech] = nodal_df[tech]*(1-ratio_residential)
 
+    threshold = snakemake.config['existing_capacities']['threshold_capacity']
+
+    def above_threshold(p_nom):
+        # links with p_nom=nan corresponding to extra nodes in country and
+        # links whose lifetime is over with p_nom=0 are not added
+        return p_nom.index[p_nom >= threshold]
+
+    index = get_component_index(n, "Bus")
     nodes={}
+    for name in heat_systems:
+        nodes[name] = pd.Index(n.buses.location[(index.heat_system == name) & contains(index.technology, "heat")].values)
+
+    # the links of all heat systems and grouping years are staged and
+    # imported at once
+    staged = StagedNetwork(n)
+
     p_nom={}
-    for name in ["residential rural",
-                 "services rural",
-                 "residential urban decentral",
-                 "services urban decentral",
-                 "urban central"]:
+    for name in heat_systems:
 
         name_type = "central" if name == "urban central" else "decentral"
-        nodes[name] = pd.Index([n.buses.at[index,"location"] for index in n.buses.index[n.buses.index.str.contains(name) & n.buses.index.str.contains('heat')]])
         heat_pump_type = "air" if "urban" in name else "ground"
         heat_type= "residential" if "residential" in name else "services"
 
@@ -343,64 +366,69 @@ def add_heating_capacities_installed_before_baseyear(n, baseyear, grouping_years
                 #installation is assumed to be linear for the past 25 years (default lifetime)
                 ratio = (int(grouping_year)-int(grouping_years[i-1]))/default_lifetime
 
-            n.madd("Link",
-                   nodes[name],
-                   suffix=" {} {} heat pump-{}".format(name,heat_pump_type, grouping_year),
-                   bus0=nodes[name],
-                   bus1=nodes[name] + " " + name + " heat",
-                   carrier="{} {} heat pump".format(name,heat_pump_type),
-                   efficiency=efficiency,
-                   capital_cost=costs.at[costs_name,'efficiency']*costs.at[costs_name,'fixed'],
-                   p_nom=p_nom[name]*ratio/costs.at[costs_name,'efficiency'],
-                   build_year=int(grouping_year),
-                   lifetime=costs.at[costs_name,'lifetime'])
+            p_nom_hp = p_nom[name]*ratio/costs.at[costs_name,'efficiency']
+            hp_nodes = above_threshold(p_nom_hp)
+            staged.madd("Link",
+                        hp_nodes,
+                        suffix=" {} {} heat pump-{}".format(name,heat_pump_type, grouping_year),
+                        bus0=hp_nodes,
+                        bus1=hp_nodes + " " + name + " heat",
+                        carrier="{} {} heat pump".format(name,heat_pump_type),
+                        efficiency=efficiency[hp_nodes] if time_dep_hp_cop else efficiency,
+                        capital_cost=costs.at[costs_name,'efficiency']*costs.at[costs_name,'fixed'],
+                        p_nom=p_nom_hp[hp_nodes],
+                        build_year=int(grouping_year),
+                        lifetime=costs.at[costs_name,'lifetime'])
 
             # add resistive heater, gas boilers and oil boilers
             # (50% capacities to rural buses, 50% to urban buses)
-            n.madd("Link",
-                   nodes[name],
-                   suffix= " " + name + " resistive heater-{}".format(grouping_year),
-                   bus0=nodes[name],
-                   bus1=nodes[name] + " " + name + " heat",
-                   carrier=name + " resistive heater",
-                   efficiency=costs.at[name_type + ' resistive heater','efficiency'],
-                   capital_cost=costs.at[name_type + ' resistive heater','efficiency']*costs.at[name_type + ' resistive heater','fixed'],
-                   p_nom=0.5*nodal_df['{} resistive heater'.format(heat_type)][nodes[name]]*ratio/costs.at[name_type + ' resistive heater','efficiency'],
-                   build_year=int(grouping_year),
-                   lifetime=costs.at[costs_name,'lifetime'])
-
-            n.madd("Link",
-                   nodes[name],
-                   suffix= " " + name + " gas boiler-{}".format(grouping_year),
-                   bus0=["EU gas"]*len(nodes[name]),
-                   bus1=nodes[name] + " " + name + " heat",
-                   bus2="co2 atmosphere",
-                   carrier=name + " gas boiler",
-                   efficiency=costs.at[name_type + ' gas boiler','efficiency'],
-                   efficiency2=costs.at['gas','CO2 intensity'],
-                   capital_cost=costs.at[name_type + ' gas boiler','efficiency']*costs.at[name_type + ' gas boiler','fixed'],
-                   p_nom=0.5*nodal_df['{} gas boiler'.format(heat_type)][nodes[name]]*ratio/costs.at[name_type + ' gas boiler','efficiency'],
-                   build_year=int(grouping_year),
-                   lifetime=costs.at[name_type + ' gas boiler','lifetime'])
-            n.madd("Link",
-                   nodes[name],
-                   suffix=" " + name + " oil boiler-{}".format(grouping_year),
-                   bus0=["EU oil"]*len(nodes[name]),
-                   bus1=nodes[name] + " " + name + " heat",
-                   bus2="co2 atmosphere",
-                   carrier=name + " oil boiler",
-                   efficiency=costs.at['decentral oil boiler','efficiency'],
-                   efficiency2=costs.at['oil','CO2 intensity'],
-                   capital_cost=costs.at['decentral oil boiler','efficiency']*costs.at['decentral oil boiler','fixed'],
-                   p_nom=0.5*nodal_df['{} oil boiler'.format(heat_type)][nodes[name]]*ratio/costs.at['decentral oil boiler','efficiency'],
-                   build_year=int(grouping_year),
-                   lifetime=costs.at[name_type + ' gas boiler','lifetime'])
-
-            # delete links with p_nom=nan corresponding to extra nodes in country
-            n.mremove("Link", [index for index in n.links.index.to_list() if str(grouping_year) in index and np.isnan(n.links.p_nom[index])])
-
-            # delete links if their lifetime is over and p_nom=0
-            n.mremove("Link", [index for index in n.links.index.to_list() if str(grouping_year) in index and n.links.p_nom[index]<snakemake.config['existing_capacities']['threshold_capacity']])
+            p_nom_rh = 0.5*nodal_df['{} resistive heater'.format(heat_type)][nodes[name]]*ratio/costs.at[name_type + ' resistive heater','efficiency']
+            rh_nodes = above_threshold(p_nom_rh)
+            staged.madd("Link",
+                        rh_nodes,
+                        suffix= " " + name + " resistive heater-{}".format(grouping_year),
+                        bus0=rh_nodes,
+                        bus1=rh_nodes + " " + name + " heat",
+                        carrier=name + " resistive heater",
+                        efficiency=costs.at[name_type + ' resistive heater','efficiency'],
+                        capital_cost=costs.at[name_type + ' resistive heater','efficiency']*costs.at[name_type + ' resistive heater','fixed'],
+                        p_nom=p_nom_rh[rh_nodes],
+                        build_year=int(grouping_year),
+                        lifetime=costs.at[costs_name,'lifetime'])
+
+            p_nom_gb = 0.5*nodal_df['{} gas boiler'.format(heat_type)][nodes[name]]*ratio/costs.at[name_type + ' gas boiler','efficiency']
+            gb_nodes = above_threshold(p_nom_gb)
+            staged.madd("Link",
+                        gb_nodes,
+                        suffix= " " + name + " gas boiler-{}".format(grouping_year),
+                        bus0="EU gas",
+                        bus1=gb_nodes + " " + name + " heat",
+                        bus2="co2 atmosphere",
+                        carrier=name + " gas boiler",
+                        efficiency=costs.at[name_type + ' gas boiler','efficiency'],
+                        efficiency2=costs.at['gas','CO2 intensity'],
+                        capital_cost=costs.at[name_type + ' gas boiler','efficiency']*costs.at[name_type + ' gas boiler','fixed'],
+                        p_nom=p_nom_gb[gb_nodes],
+                        build_year=int(grouping_year),
+                        lifetime=costs.at[name_type + ' gas boiler','lifetime'])
+
+            p_nom_ob = 0.5*nodal_df['{} oil boiler'.format(heat_type)][nodes[name]]*ratio/costs.at['decentral oil boiler','efficiency']
+            ob_nodes = above_threshold(p_nom_ob)
+            staged.madd("Link",
+                        ob_nodes,
+                        suffix=" " + name + " oil boiler-{}".format(grouping_year),
+                        bus0="EU oil",
+                        bus1=ob_nodes + " " + name + " heat",
+                        bus2="co2 atmosphere",
+                        carrier=name + " oil boiler",
+                        efficiency=costs.at['decentral oil boiler','efficiency'],
+                        efficiency2=costs.at['oil','CO2 intensity'],
+                        capital_cost=costs.at['decentral oil boiler','efficiency']*costs.at['decentral oil boiler','fixed'],
+                        p_nom=p_nom_ob[ob_nodes],
+                        build_year=int(grouping_year),
+                        lifetime=costs.at[name_type + ' gas boiler','lifetime'])
+
+    staged.flush()
 
 
 if __name__ == "__main__":
@@ -415,7 +443,7 @@ if __name__ == "__main__":
                        powerplants='pypsa-eur/resources/powerplants.csv',
                        busmap_s='pypsa-eur/resources/busmap_elec_s{simpl}.csv',
                        busmap='pypsa-eur/resources/busmap_elec_s{simpl}_{clusters}.csv',
-                       costs='technology_data/outputs/costs_{planning_horizons}.csv',
+                       costs='pypsa-eur-sec/resources/costs_{planning_horizons}.h5',
                        cop_air_total="pypsa-eur-sec/resources/cop_air_total_elec_s{simpl}_{clusters}.nc",
                        cop_soil_total="pypsa-eur-sec/resources/cop_soil_total_elec_s{simpl}_{clusters}.nc",
                        clustered_pop_layout="pypsa-eur-sec/resources/pop_layout_elec_s{simpl}_{clusters}.csv",),
@@ -433,17 +461,13 @@ if __name__ == "__main__":
 
     baseyear= snakemake.config['scenario']["planning_horizons"][0]
 
-    n = pypsa.Network(snakemake.input.network,
-                      override_component_attrs=override_component_attrs)
+    n = load_network(snakemake.input.network,
+                     override_component_attrs=override_component_attrs)
 
     add_build_year_to_new_assets(n, baseyear)
 
     Nyears = n.snapshot_weightings.sum()/8760.
-    costs = prepare_costs(snakemake.input.costs,
-                          snakemake.config['costs']['USD2013_to_EUR2013'],
-                          snakemake.config['costs']['discountrate'],
-                          Nyears,
-                          snakemake.config['costs']['lifetime'])
+    costs = load_costs(snakemake.input.costs, Nyears)
 
     grouping_years=snakemake.config['existing_capacities']['grouping_years']
     add_power_capacities_installed_before_baseyear(n, grouping_years, costs, baseyear)
@@ -455,4 +479,4 @@ if __name__ == "__main__":
         default_lifetime = snakemake.config['costs']['lifetime']
         add_heating_capacities_installed_before_baseyear(n, baseyear, grouping_years, ashp_cop, gshp_cop, time_dep_hp_cop, costs, default_lifetime)
 
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0], snakemake.config['network_io'])
@@ -0,0 +1,191 @@
+"""Benchmark solvers and solver options on a prepared sector-coupled network.
+
+Every combination of the option grids in config['solver_benchmark'] is
+solved with solve_network in a separate process under a time and memory
+budget. Build and solve time, solver iterations, peak memory and the gap
+to the best objective found are written to one row per combination.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import copy
+import time
+import signal
+import itertools
+import resource
+import multiprocessing as mp
+from queue import Empty
+
+import numpy as np
+import pandas as pd
+
+import pypsa
+
+from vresutils.benchmark import memory_logger
+
+import solve_network as sn
+
+
+# iteration counts reported in the solver logs, the largest match is used
+# since some solvers report cumulative counts or a final clean-up solve
+iteration_patterns = {"gurobi": r"Solved in (\d+) iterations",
+                      "cplex": r"[Ii]terations\s*=\s*(\d+)",
+                      "cbc": r"(\d+) iterations",
+                      "glpk": r"^\*?\s*(\d+): obj ="}
+
+
+def option_grid(solvers):
+    """Expand {solver_name: {option: value or list of values}} into a list
+    of solver configurations, one for each combination of values."""
+
+    grid = []
+    for solver_name, options in solvers.items():
+        options = options or {}
+        keys = list(options)
+        values = [v if isinstance(v, list) else [v] for v in options.values()]
+        for combination in itertools.product(*values):
+            grid.append(dict(name=solver_name, **dict(zip(keys, combination))))
+    return grid
+
+
+def read_iterations(solver_name, solver_log):
+
+    if not os.path.isfile(solver_log):
+        return np.nan
+
+    with open(solver_log) as f:
+        matches = re.findall(iteration_patterns.get(solver_name, r"(\d+) iterations"),
+                             f.read(), flags=re.MULTILINE)
+
+    return max(int(m) for m in matches) if matches else np.nan
+
+
+def run_benchmark(network_fn, config, solver_log, mem_limit, interval, queue):
+
+    # own process group, so that solver processes started by pypsa are
+    # terminated together with this one
+    os.setpgrp()
+
+    # the soft limit on the address space applies to the solver processes as
+    # well and is lifted again for reporting the results
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+
+    timings = []
+    record = {}
+    with memory_logger(filename=None, interval=interval, max_usage=True) as mem:
+        if mem_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (int(mem_limit*2**20), hard))
+        try:
+            n = pypsa.Network(network_fn, override_component_attrs=sn.override_component_attrs)
+            n = sn.prepare_network(n, config['options'])
+            n = sn.solve_network(n, config=config, solver_log=solver_log, timings=timings)
+            record.update(status="ok", objective=n.objective)
+        except MemoryError:
+            record["status"] = "memory limit"
+        except Exception as e:
+            logger.exception("Solving failed")
+            record["status"] = "{}: {}".format(type(e).__name__, e)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+    record.update(runs=len(timings),
+                  build_time=sum(t.get('prepare', 0.) for t in timings),
+                  solve_time=sum(t.get('solve', 0.) for t in timings),
+                  total_time=sum(t.get('total', 0.) for t in timings),
+                  peak_mem_mb=mem.mem_usage[0])
+
+    queue.put(record)
+
+
+def benchmark_solvers(network_fn, solving, bench, solver_log):
+
+    ctx = mp.get_context("fork")
+    time_limit = bench.get('time_limit')
+
+    records = []
+    for i, solver in enumerate(option_grid(bench['solvers'])):
+        logger.info("Benchmarking option set {}: {}".format(i, solver))
+
+        config = copy.deepcopy(solving)
+        config['options'].update(bench.get('options', {}))
+        config['solver'] = dict(solver)
+
+        root, ext = os.path.splitext(solver_log)
+        log_fn = "{}_{}{}".format(root, i, ext)
+        if os.path.exists(log_fn):
+            os.remove(log_fn)
+
+        queue = ctx.Queue()
+        p = ctx.Process(target=run_benchmark,
+                        args=(network_fn, config, log_fn,
+                              bench.get('mem_limit'), bench.get('interval', 1.), queue))
+        start = time.time()
+        p.start()
+
+        record = None
+        while record is None:
+            try:
+                record = queue.get(timeout=1.)
+            except Empty:
+                if not p.is_alive():
+                    record = dict(status="exited with code {}".format(p.exitcode))
+                elif time_limit is not None and time.time() - start > time_limit:
+                    logger.warning("Option set {} exceeded the time limit".format(i))
+                    record = dict(status="time limit")
+
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            p.kill()
+        p.join()
+
+        record['iterations'] = read_iterations(solver['name'], log_fn)
+        records.append(dict(solver=solver['name'],
+                            options=", ".join("{}={}".format(k, v) for k, v in solver.items()
+                                              if k != 'name'),
+                            **record))
+
+    df = pd.DataFrame(records)
+    df.index.name = "option_set"
+
+    if "objective" not in df:
+        df["objective"] = np.nan
+    best = df.loc[df.status == "ok", "objective"].min()
+    df["objective_gap"] = (df["objective"] - best)/abs(best)
+
+    columns = ["solver", "options", "status", "runs", "build_time", "solve_time",
+               "total_time", "iterations", "peak_mem_mb", "objective", "objective_gap"]
+    return df.reindex(columns=columns)
+
+
+if __name__ == "__main__":
+    # Detect running outside of snakemake and mock snakemake for testing
+    if 'snakemake' not in globals():
+        from vresutils.snakemake import MockSnakemake
+        snakemake = MockSnakemake(
+            wildcards=dict(network='elec', simpl='', clusters='37', lv='1.0',
+                           opts='', sector_opts='Co2L0-168H-T-H-B-I-solar3-dist1',
+                           planning_horizons='2030'),
+            input=dict(network="results/test/prenetworks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_{planning_horizons}.nc"),
+            output=["results/test/solver_benchmarks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_{planning_horizons}.csv"],
+            log=dict(solver="results/test/logs/solver_benchmarks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_{planning_horizons}_solver.log",
+                     python="results/test/logs/solver_benchmarks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_{planning_horizons}_python.log")
+        )
+        import yaml
+        with open('config.yaml', encoding='utf8') as f:
+            snakemake.config = yaml.safe_load(f)
+
+    logging.basicConfig(filename=snakemake.log.python,
+                        level=snakemake.config['logging_level'])
+
+    # the constraints in solve_network read the wildcards and config from there
+    sn.snakemake = snakemake
+
+    df = benchmark_solvers(snakemake.input.network,
+                           snakemake.config['solving'],
+                           snakemake.config['solver_benchmark'],
+                           snakemake.log.solver)
+
+    df.to_csv(snakemake.output[0])
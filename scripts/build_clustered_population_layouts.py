@@ -1,5 +1,4 @@
 
-import geopandas as gpd
 import xarray as xr
 import pandas as pd
 import atlite
@@ -10,19 +9,15 @@ cutout = atlite.Cutout(snakemake.config['atlite']['cutout_name'],
                        cutout_dir=snakemake.config['atlite']['cutout_dir'])
 
 
-clustered_busregions_as_geopd = gpd.read_file(snakemake.input.regions_onshore).set_index('name', drop=True)
-
-clustered_busregions = pd.Series(clustered_busregions_as_geopd.geometry, index=clustered_busregions_as_geopd.index)
-
-helper.clean_invalid_geometries(clustered_busregions)
-
-I = cutout.indicatormatrix(clustered_busregions)
+I, clustered_busregions_index = helper.load_indicator_matrix(snakemake.input.indicator_matrix,
+                                                             snakemake.input.regions_onshore,
+                                                             cutout)
 
 
 items = ["total","urban","rural"]
 
 pop = pd.DataFrame(columns=items,
-                   index=clustered_busregions.index)
+                   index=clustered_busregions_index)
 
 
 for item in items:
@@ -0,0 +1,48 @@
+"""Build the CO2 emissions by year, country and sector from which the
+carbon budget paths in prepare_sector_network are computed.
+
+The table is built once from the UNFCCC inventory and the Eurostat
+energy balances for the years in co2_emissions_years, so that the
+network preparation jobs look the emissions up instead of each parsing
+the inventory and the Excel workbooks again.
+"""
+
+import pandas as pd
+
+from functools import partial
+
+import excel_cache
+from build_energy_totals import build_eea_co2, build_eurostat_co2, build_co2_totals, eurostat_request
+
+if 'snakemake' not in globals():
+    from vresutils import Dict
+    import yaml
+    snakemake = Dict()
+    with open('config.yaml') as f:
+        snakemake.config = yaml.safe_load(f)
+    snakemake.threads = 1
+    snakemake.output = Dict()
+    snakemake.output['co2_emissions'] = "resources/co2_emissions.csv"
+
+
+def eurostat_year(year):
+    # TODO: read Eurostat data from year>2014, this only affects the estimation of
+    # CO2 emissions for "BA","RS","AL","ME","MK"
+    return min(year, 2014)
+
+
+years = snakemake.config['co2_emissions_years']
+
+read_excel = partial(excel_cache.read_excel,
+                     cache_config=snakemake.config['excel_cache'])
+
+#parse the Eurostat workbooks which are not cached yet in parallel
+excel_cache.prefetch([eurostat_request(eurostat_year(year)) for year in years],
+                     snakemake.config['excel_cache'], snakemake.threads)
+
+co2_emissions = pd.concat({year : build_co2_totals(build_eea_co2(year),
+                                                   build_eurostat_co2(eurostat_year(year), read_excel))
+                           for year in years},
+                          names=["year", "country"])
+
+co2_emissions.to_csv(snakemake.output.co2_emissions)
@@ -1,6 +1,17 @@
 
+import dask
 import xarray as xr
 
+if 'snakemake' not in globals():
+    from vresutils import Dict
+    import yaml
+    snakemake = Dict()
+    with open('config.yaml') as f:
+        snakemake.config = yaml.safe_load(f)
+    snakemake.input = Dict()
+    snakemake.output = Dict()
+    snakemake.threads = 1
+
 #quadratic regression based on Staffell et al. (2012)
 #https://doi.org/10.1039/C2EE22653G
 
@@ -10,13 +21,40 @@ cop_f = {"air" : lambda d_t: 6.81 -0.121*d_t + 0.000630*d_t**2,
          "soil" : lambda d_t: 8.77 -0.150*d_t + 0.000734*d_t**2}
 
 
-for area in ["total", "urban", "rural"]:
-    for source in ["air", "soil"]:
+def open_temperature(fns, time_chunk):
+    """Open the temperature profiles in fns lazily in chunks of time_chunk
+    time steps; several files, e.g. one per weather year, are stacked
+    along time."""
+
+    if isinstance(fns, str):
+        fns = [fns]
+
+    return xr.concat([xr.open_dataarray(fn, chunks={'time': time_chunk}) for fn in fns],
+                     dim='time')
+
+
+def to_netcdf(da, fn, time_chunk, complevel):
+    """Write da chunked along time and compressed unless complevel is 0,
+    computing it chunk by chunk."""
+
+    chunksizes = tuple(min(time_chunk, size) if dim == 'time' else size
+                       for dim, size in zip(da.dims, da.shape))
+    da.encoding = dict(zlib=complevel > 0, complevel=complevel, chunksizes=chunksizes)
+    da.to_netcdf(fn)
+
+
+config = snakemake.config['cop_profiles']
+
+with dask.config.set(scheduler='threads', num_workers=snakemake.threads):
+    for area in ["total", "urban", "rural"]:
+        for source in ["air", "soil"]:
 
-        source_T = xr.open_dataarray(snakemake.input["temp_{}_{}".format(source,area)])
+            source_T = open_temperature(snakemake.input["temp_{}_{}".format(source,area)],
+                                        config['time_chunk'])
 
-        delta_T = snakemake.config['sector']['heat_pump_sink_T'] - source_T
+            delta_T = snakemake.config['sector']['heat_pump_sink_T'] - source_T
 
-        cop = cop_f[source](delta_T)
+            cop = cop_f[source](delta_T)
 
-        cop.to_netcdf(snakemake.output["cop_{}_{}".format(source,area)])
+            to_netcdf(cop, snakemake.output["cop_{}_{}".format(source,area)],
+                      config['time_chunk'], config['complevel'])
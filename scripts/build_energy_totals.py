@@ -1,6 +1,10 @@
 import pandas as pd
 import geopandas as gpd
 
+from functools import partial
+
+import excel_cache
+
 idx = pd.IndexSlice
 
 #translations for Eurostat
@@ -63,9 +67,21 @@ eu28_eea = eu28[:]
 eu28_eea.remove("GB")
 eu28_eea.append("UK")
 
+#rebound to the cached reader with the configuration of the workflow
+read_excel = excel_cache.read_excel
+
+idees_dir = "data/jrc-idees-2015"
+
+#sheets read from the JRC-IDEES workbooks of each sector
+idees_sheets = {"Residential" : ["RES_hh_fec", "RES_summary"],
+                "Tertiary" : ["SER_hh_fec", "SER_summary"],
+                "Transport" : ["TrRoad_ene", "TrRail_ene", "TrAvia_ene",
+                               "TrNavi_ene", "TrRoad_act"]}
+
 
-def build_eurostat(year):
-    """Return multi-index for all countries' energy data in TWh/a."""
+def eurostat_request(year):
+    """Return the workbook and read_excel arguments of the Eurostat
+    energy balances for year."""
 
     stats_from_year = 2016
 
@@ -74,10 +90,31 @@ def build_eurostat(year):
     #2016 includes BA, 2017 doesn't
 
     #with sheet as None, an ordered dictionary of all sheets is returned
-    dfs = pd.read_excel(fns[stats_from_year].format(year=year),
-                        None,
-                        skiprows=1,
-                        index_col=list(range(4)))
+    return fns[stats_from_year].format(year=year), dict(sheet_name=None,
+                                                        skiprows=1,
+                                                        index_col=list(range(4)))
+
+
+def idees_requests():
+    """Return the workbooks and read_excel arguments of all JRC-IDEES
+    sheets read by build_idees."""
+
+    return [("{}/JRC-IDEES-2015_{}_{}.xlsx".format(idees_dir,sector,rename.get(ct,ct)),
+             dict(sheet_name=sheet))
+            for ct in population.index if ct not in non_EU
+            for sector, sheets in idees_sheets.items()
+            for sheet in sheets]
+
+
+def build_eurostat(year, reader=None):
+    """Return multi-index for all countries' energy data in TWh/a, read
+    with reader, read_excel of this module by default."""
+
+    if reader is None:
+        reader = read_excel
+
+    fn, kwargs = eurostat_request(year)
+    dfs = reader(fn, **kwargs)
 
     #sorted_index necessary for slicing
     df = pd.concat({country_to_code[df.columns[0]] : df for ct,df in dfs.items()},sort=True).sort_index()
@@ -94,8 +131,6 @@ def build_swiss(year):
 
 
 def build_idees(year):
-    base_dir = "data/jrc-idees-2015"
-
     totals = pd.DataFrame()
 
     #convert ktoe/a to TWh/a
@@ -109,8 +144,8 @@ def build_idees(year):
 
         #RESIDENTIAL
 
-        filename = "{}/JRC-IDEES-2015_Residential_{}.xlsx".format(base_dir,rename.get(ct,ct))
-        df = pd.read_excel(filename,"RES_hh_fec")
+        filename = "{}/JRC-IDEES-2015_Residential_{}.xlsx".format(idees_dir,rename.get(ct,ct))
+        df = read_excel(filename,"RES_hh_fec")
 
         assert df.iloc[2,0] == "Space heating"
         totals.loc[ct,"total residential space"] = df.loc[2,year]
@@ -129,7 +164,7 @@ def build_idees(year):
         assert df.iloc[30,0] == "Electricity"
         totals.loc[ct,"electricity residential cooking"] = df.loc[30,year]
 
-        df = pd.read_excel(filename,"RES_summary")
+        df = read_excel(filename,"RES_summary")
 
         assert df.iloc[34,0] == "Energy consumption by fuel - Eurostat structure (ktoe)"
         totals.loc[ct,"total residential"] = df.loc[34,year]
@@ -140,8 +175,8 @@ def build_idees(year):
 
         #SERVICES
 
-        filename = "{}/JRC-IDEES-2015_Tertiary_{}.xlsx".format(base_dir,rename.get(ct,ct))
-        df = pd.read_excel(filename,"SER_hh_fec")
+        filename = "{}/JRC-IDEES-2015_Tertiary_{}.xlsx".format(idees_dir,rename.get(ct,ct))
+        df = read_excel(filename,"SER_hh_fec")
 
         assert df.iloc[2,0] == "Space heating"
         totals.loc[ct,"total services space"] = df.loc[2,year]
@@ -160,7 +195,7 @@ def build_idees(year):
         assert df.iloc[31,0] == "Electricity"
         totals.loc[ct,"electricity services cooking"] = df.loc[31,year]
 
-        df = pd.read_excel(filename,"SER_summary")
+        df = read_excel(filename,"SER_summary")
 
         assert df.iloc[37,0] == "Energy consumption by fuel - Eurostat structure (ktoe)"
         totals.loc[ct,"total services"] = df.loc[37,year]
@@ -171,9 +206,9 @@ def build_idees(year):
 
         # TRANSPORT
 
-        filename = "{}/JRC-IDEES-2015_Transport_{}.xlsx".format(base_dir,rename.get(ct,ct))
+        filename = "{}/JRC-IDEES-2015_Transport_{}.xlsx".format(idees_dir,rename.get(ct,ct))
 
-        df = pd.read_excel(filename,"TrRoad_ene")
+        df = read_excel(filename,"TrRoad_ene")
 
         assert df.iloc[2,0] == "by fuel (EUROSTAT DATA)"
         totals.loc[ct,"total road"] = df.loc[2,year]
@@ -205,7 +240,7 @@ def build_idees(year):
         totals.loc[ct,"passenger car efficiency"] = df.loc[61,year]
 
 
-        df = pd.read_excel(filename,"TrRail_ene")
+        df = read_excel(filename,"TrRail_ene")
 
         assert df.iloc[2,0] == "by fuel (EUROSTAT DATA)"
         totals.loc[ct,"total rail"] = df.loc[2,year]
@@ -225,7 +260,7 @@ def build_idees(year):
         totals.loc[ct,"electricity rail freight"] = df.loc[23,year]
 
 
-        df = pd.read_excel(filename,"TrAvia_ene")
+        df = read_excel(filename,"TrAvia_ene")
 
         assert df.iloc[6,0] == "Passenger transport"
         totals.loc[ct,"total aviation passenger"] = df.loc[6,year]
@@ -246,14 +281,14 @@ def build_idees(year):
         totals.loc[ct,"total domestic aviation"] = totals.loc[ct,["total domestic aviation freight","total domestic aviation passenger"]].sum()
         totals.loc[ct,"total international aviation"] = totals.loc[ct,["total international aviation freight","total international aviation passenger"]].sum()
 
-        df = pd.read_excel(filename,"TrNavi_ene")
+        df = read_excel(filename,"TrNavi_ene")
 
         #coastal and inland
         assert df.iloc[2,0] == "by fuel (EUROSTAT DATA)"
         totals.loc[ct,"total domestic navigation"] = df.loc[2,year]
 
 
-        df = pd.read_excel(filename,"TrRoad_act")
+        df = read_excel(filename,"TrRoad_act")
 
         assert df.iloc[85,0] == "Passenger cars"
         totals.loc[ct,"passenger cars"] = df.loc[85,year]
@@ -434,9 +469,9 @@ def build_eea_co2(year=1990):
     return emissions/1e3
 
 
-def build_eurostat_co2(year=1990):
+def build_eurostat_co2(year=1990, reader=None):
 
-    eurostat_for_co2 = build_eurostat(year)
+    eurostat_for_co2 = build_eurostat(year, reader)
 
     se = pd.Series(index=eurostat_for_co2.columns,dtype=float)
 
@@ -523,7 +558,11 @@ if __name__ == "__main__":
     # Detect running outside of snakemake and mock snakemake for testing
     if 'snakemake' not in globals():
         from vresutils import Dict
+        import yaml
         snakemake = Dict()
+        with open('config.yaml') as f:
+            snakemake.config = yaml.safe_load(f)
+        snakemake.threads = 1
         snakemake.output = Dict()
         snakemake.output['energy_name'] = "data/energy_totals.csv"
         snakemake.output['co2_name'] = "data/co2_totals.csv"
@@ -535,7 +574,17 @@ if __name__ == "__main__":
     nuts3 = gpd.read_file(snakemake.input.nuts3_shapes).set_index('index')
     population = nuts3['pop'].groupby(nuts3.country).sum()
 
+    read_excel = partial(excel_cache.read_excel,
+                         cache_config=snakemake.config['excel_cache'])
+
     data_year = 2011
+    base_year_emissions = 1990
+
+    #parse all workbooks which are not cached yet in parallel
+    excel_cache.prefetch([eurostat_request(data_year), eurostat_request(base_year_emissions)]
+                         + idees_requests(),
+                         snakemake.config['excel_cache'], snakemake.threads)
+
     eurostat = build_eurostat(data_year)
     swiss = build_swiss(data_year)
     idees = build_idees(data_year)
@@ -543,7 +592,6 @@ if __name__ == "__main__":
     build_energy_totals(eurostat, swiss, idees)
 
 
-    base_year_emissions = 1990
     eea_co2 = build_eea_co2(base_year_emissions)
     eurostat_co2 = build_eurostat_co2(base_year_emissions)
 	
@@ -0,0 +1,27 @@
+"""Build the sparse indicator matrix of the onshore bus regions on the
+grid of the weather cutout once per clustering, for the heat demand,
+temperature, solar thermal and population builders."""
+
+import atlite
+import helper
+
+if 'snakemake' not in globals():
+    from vresutils import Dict
+    import yaml
+    snakemake = Dict()
+    with open('config.yaml') as f:
+        snakemake.config = yaml.safe_load(f)
+    snakemake.input = Dict()
+    snakemake.output = Dict()
+
+
+cutout = atlite.Cutout(snakemake.config['atlite']['cutout_name'],
+                       cutout_dir=snakemake.config['atlite']['cutout_dir'])
+
+clustered_busregions = helper.read_busregions(snakemake.input.regions_onshore)
+
+I = cutout.indicatormatrix(clustered_busregions)
+
+helper.save_indicator_matrix(snakemake.output.indicator_matrix, I,
+                             clustered_busregions.index,
+                             helper.indicator_matrix_key(snakemake.input.regions_onshore, cutout))
@@ -1,8 +1,8 @@
 
 import pypsa
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely import wkt, prepared
 from scipy.spatial import cKDTree as KDTree
 
 
@@ -16,15 +16,18 @@ def prepare_hotmaps_database():
     df.drop(df.index[df.geom.isna()],
             inplace=True)
 
-    #parse geometry
-    #https://geopandas.org/gallery/create_geopandas_from_pandas.html?highlight=parse#from-wkt-format
-    df["Coordinates"] = df.geom.apply(lambda x : wkt.loads(x[x.find(";POINT")+1:]))
+    #parse the coordinates of all points at once from geometries like
+    #"SRID=4326;POINT(4.3 50.8)"
+    coordinates = df.geom.str.extract(r";POINT\s*\(\s*(\S+)\s+(\S+)\s*\)").astype(float)
+    df["Coordinates"] = gpd.points_from_xy(coordinates[0], coordinates[1])
 
     gdf = gpd.GeoDataFrame(df, geometry='Coordinates')
 
+    #a single query of the spatial index for all points within Europe
     europe_shape = gpd.read_file(snakemake.input.europe_shape).loc[0, 'geometry']
-    europe_shape_prepped = prepared.prep(europe_shape)
-    not_in_europe = gdf.index[~gdf.geometry.apply(europe_shape_prepped.contains)]
+    in_europe = np.zeros(len(gdf), dtype=bool)
+    in_europe[gdf.sindex.query(europe_shape, predicate="contains")] = True
+    not_in_europe = gdf.index[~in_europe]
     print("Removing the following industrial facilities since they are not in European area:")
     print(gdf.loc[not_in_europe])
     gdf.drop(not_in_europe,
@@ -82,20 +85,34 @@ def prepare_hotmaps_database():
 
 
 def assign_buses(gdf):
+    """Assign each facility to the closest bus in its country.
+
+    All facilities are assigned with a single KD-tree query. The country
+    is an additional coordinate, spaced further apart than any two
+    points are, so that the closest bus is always one in the same
+    country, at the same distance as in a tree of that country only.
+    """
 
     gdf["bus"] = ""
 
-    for c in n.buses.country.unique():
-        buses_i = n.buses.index[n.buses.country == c]
-        kdtree = KDTree(n.buses.loc[buses_i, ['x','y']].values)
+    countries = pd.Index(n.buses.country.unique())
+    bus_ct = countries.get_indexer(n.buses.country)
+    industry_ct = countries.get_indexer(gdf.country_code)
+
+    for c in countries.difference(gdf.country_code.dropna().unique()):
+        print("Skipping country with no industry:",c)
+
+    industry_b = industry_ct >= 0
+    if industry_b.any():
+        bus_xy = n.buses[['x','y']].values
+        industry_xy = gdf.loc[industry_b, ['x','y']].values
 
-        industry_i = gdf.index[(gdf.country_code == c)]
+        xy = np.vstack([bus_xy, industry_xy])
+        spacing = 2*np.hypot(*np.ptp(xy, axis=0)) + 1.
 
-        if industry_i.empty:
-            print("Skipping country with no industry:",c)
-        else:
-            tree_i = kdtree.query(gdf.loc[industry_i, ['x','y']].values)[1]
-            gdf.loc[industry_i, 'bus'] = buses_i[tree_i]
+        kdtree = KDTree(np.column_stack([bus_xy, spacing*bus_ct]))
+        tree_i = kdtree.query(np.column_stack([industry_xy, spacing*industry_ct[industry_b]]))[1]
+        gdf.loc[industry_b, 'bus'] = n.buses.index[tree_i]
 
     if (gdf.bus == "").any():
         print("Some industrial facilities have empty buses")
@@ -2,6 +2,13 @@
 import pandas as pd
 import numpy as np
 
+from functools import partial
+
+import excel_cache
+
+read_excel = partial(excel_cache.read_excel,
+                     cache_config=snakemake.config['excel_cache'])
+
 
 tj_to_ktoe = 0.0238845
 ktoe_to_twh = 0.01163
@@ -57,15 +64,15 @@ for country in countries_df.index:
         if country == 'CH':
             countries_df.loc[country, 'current electricity']=dic_Switzerland['current electricity']*tj_to_ktoe*ktoe_to_twh
         else:
-            excel_balances = pd.read_excel('{}/{}.XLSX'.format(eb_base_dir,eb_names[country]),
-                                      sheet_name='2016', index_col=1,header=0, skiprows=1 ,squeeze=True)
+            excel_balances = read_excel('{}/{}.XLSX'.format(eb_base_dir,eb_names[country]),
+                                   sheet_name='2016', index_col=1,header=0, skiprows=1 ,squeeze=True)
 
             countries_df.loc[country, 'current electricity'] = excel_balances.loc['Industry', 'Electricity']*ktoe_to_twh
 
     else:
 
-        excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(jrc_base_dir,jrc_names.get(country,country)),
-                                  sheet_name='Ind_Summary',index_col=0,header=0,squeeze=True) # the summary sheet
+        excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(jrc_base_dir,jrc_names.get(country,country)),
+                               sheet_name='Ind_Summary',index_col=0,header=0,squeeze=True) # the summary sheet
 
         s_out = excel_out.iloc[27:48,-1]
         countries_df.loc[country, 'current electricity'] = s_out['Electricity']*ktoe_to_twh
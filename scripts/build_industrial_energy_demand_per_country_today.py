@@ -1,6 +1,13 @@
 
 import pandas as pd
 
+from functools import partial
+
+import excel_cache
+
+read_excel = partial(excel_cache.read_excel,
+                     cache_config=snakemake.config['excel_cache'])
+
 # sub-sectors as used in PyPSA-Eur-Sec and listed in JRC-IDEES industry sheets
 sub_sectors = {'Iron and steel' : ['Integrated steelworks','Electric arc'],
                'Non-ferrous metals' : ['Alumina production','Aluminium - primary production','Aluminium - secondary production','Other non-ferrous metals'],
@@ -64,6 +71,9 @@ eu28 = ['FR', 'DE', 'GB', 'IT', 'ES', 'PL', 'SE', 'NL', 'BE', 'FI',
 jrc_names = {"GR" : "EL",
              "GB" : "UK"}
 
+def energy_balance_filename(ct):
+    return 'data/jrc-idees-2015/JRC-IDEES-2015_EnergyBalance_{}.xlsx'.format(jrc_names.get(ct,ct))
+
 year = 2015
 summaries = {}
 
@@ -77,9 +87,14 @@ ammonia = pd.read_csv(snakemake.input.ammonia_production,
 
 
 
+#parse all workbooks which are not cached yet in parallel
+excel_cache.prefetch([(energy_balance_filename(ct), dict(sheet_name=sheet_name, index_col=0))
+                      for ct in eu28 for sheet_name in eb_sheet_name.values()],
+                     snakemake.config['excel_cache'], snakemake.threads)
+
 for ct in eu28:
     print(ct)
-    filename = 'data/jrc-idees-2015/JRC-IDEES-2015_EnergyBalance_{}.xlsx'.format(jrc_names.get(ct,ct))
+    filename = energy_balance_filename(ct)
 
     summary = pd.DataFrame(index=list(fuels.keys()) + ['other'])
 
@@ -90,9 +105,9 @@ for ct in eu28:
             subs = sub_sectors[sector]
 
         for sub in subs:
-            df = pd.read_excel(filename,
-                               sheet_name=eb_sheet_name[sub],
-                               index_col=0)
+            df = read_excel(filename,
+                            sheet_name=eb_sheet_name[sub],
+                            index_col=0)
 
             s = df[year].astype(float)
 
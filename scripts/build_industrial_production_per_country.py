@@ -2,6 +2,13 @@
 import pandas as pd
 import numpy as np
 
+from functools import partial
+
+import excel_cache
+
+read_excel = partial(excel_cache.read_excel,
+                     cache_config=snakemake.config['excel_cache'])
+
 
 tj_to_ktoe = 0.0238845
 ktoe_to_twh = 0.01163
@@ -148,6 +155,18 @@ dic_Switzerland ={'Iron and steel': 7889.,
           'Other Industrial Sectors': 10825.,
           'current electricity': 53760.}
 
+#parse all workbooks which are not cached yet in parallel
+jrc_kwargs = dict(index_col=0,header=0,squeeze=True)
+excel_cache.prefetch([('{}/{}.XLSX'.format(eb_base_dir,eb_names[country]),
+                       dict(sheet_name='2016', index_col=2,header=0, skiprows=1 ,squeeze=True))
+                      for country in non_EU if country != 'CH']
+                     + [('{}/JRC-IDEES-2015_Industry_EU28.xlsx'.format(jrc_base_dir),
+                         dict(sheet_name='Ind_Summary', **jrc_kwargs))]
+                     + [('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(jrc_base_dir,jrc_names.get(country,country)),
+                         dict(sheet_name=sub_sheet_name_dict[sector], **jrc_kwargs))
+                        for country in ['EU28'] + eu28 for sector in sectors],
+                     snakemake.config['excel_cache'], snakemake.threads)
+
 dic_sec_position={}
 for country in countries:
     countries_demand.loc[country] = 0.
@@ -159,20 +178,20 @@ for country in countries:
             else:
                 # estimate physical output
                 #energy consumption in the sector and country
-                excel_balances = pd.read_excel('{}/{}.XLSX'.format(eb_base_dir,eb_names[country]),
-                                      sheet_name='2016', index_col=2,header=0, skiprows=1 ,squeeze=True)
+                excel_balances = read_excel('{}/{}.XLSX'.format(eb_base_dir,eb_names[country]),
+                                   sheet_name='2016', index_col=2,header=0, skiprows=1 ,squeeze=True)
                 e_country = excel_balances.loc[dic_sec[sector], 'Total all products']
 
             #energy consumption in the sector and EU28
-            excel_sum_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_EU28.xlsx'.format(jrc_base_dir),
-                                  sheet_name='Ind_Summary', index_col=0,header=0,squeeze=True) # the summary sheet
+            excel_sum_out = read_excel('{}/JRC-IDEES-2015_Industry_EU28.xlsx'.format(jrc_base_dir),
+                               sheet_name='Ind_Summary', index_col=0,header=0,squeeze=True) # the summary sheet
             s_sum_out = excel_sum_out.iloc[49:76,year]
             e_EU28 = s_sum_out[dic_sec_summary[sector]]
 
             ratio_country_EU28=e_country/e_EU28
 
-            excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_EU28.xlsx'.format(jrc_base_dir),
-                                      sheet_name=sub_sheet_name_dict[sector],index_col=0,header=0,squeeze=True) # the summary sheet
+            excel_out = read_excel('{}/JRC-IDEES-2015_Industry_EU28.xlsx'.format(jrc_base_dir),
+                                   sheet_name=sub_sheet_name_dict[sector],index_col=0,header=0,squeeze=True) # the summary sheet
 
             s_out = excel_out.iloc[loc_dic[sector][0]:loc_dic[sector][1],year]
 
@@ -182,7 +201,7 @@ for country in countries:
         else:
 
             # read the input sheets
-            excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(jrc_base_dir,jrc_names.get(country,country)), sheet_name=sub_sheet_name_dict[sector],index_col=0,header=0,squeeze=True) # the summary sheet
+            excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(jrc_base_dir,jrc_names.get(country,country)), sheet_name=sub_sheet_name_dict[sector],index_col=0,header=0,squeeze=True) # the summary sheet
 
             s_out = excel_out.iloc[loc_dic[sector][0]:loc_dic[sector][1],year]
 
@@ -3,6 +3,13 @@
 import pandas as pd
 import numpy as np
 
+from functools import partial
+
+import excel_cache
+
+read_excel = partial(excel_cache.read_excel,
+                     cache_config=snakemake.config['excel_cache'])
+
 base_dir = "data/jrc-idees-2015"
 
 #Scenario parameters from config.yaml
@@ -50,17 +57,17 @@ df = pd.DataFrame(index=index)
 sector = 'Iron and steel'
 
 # read the input sheets
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True) # the summary sheet
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True) # the summary sheet
 
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True) # the final energy consumption sheet
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True) # the final energy consumption sheet
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True) # the used energy sheet
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True) # the used energy sheet
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 ### Electric arc
 
@@ -285,17 +292,17 @@ df.loc[['elec','heat','methane','coke','coal'],sector] = df.loc[['elec','heat','
 sector = 'Chemicals Industry'
 
 # read the input sheets
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True) # the summary sheet
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True) # the summary sheet
 
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True) # the final energy consumption sheet
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True) # the final energy consumption sheet
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True) # the used energy sheet
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True) # the used energy sheet
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 ### Basic chemicals
 
@@ -660,17 +667,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out.values # unit
 sector = 'Non-metallic mineral products'
 
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True)
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True)
 
 ### Cement
 #
@@ -860,14 +867,14 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out.values # unit
 sector = 'Pulp, paper and printing'
 
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
 ### Pulp production
 #
@@ -1023,14 +1030,14 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out.values # unit
 sector = 'Food, beverages and tobacco'
 
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
 df[sector] = 0
 
@@ -1083,17 +1090,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Physical outp
 sector = 'Non Ferrous Metals'
 
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 ### Alumina
 #
@@ -1301,17 +1308,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Other non-fer
 
 sector = 'Transport Equipment'
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 df[sector] = 0
 
@@ -1362,17 +1369,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Physical outp
 sector = 'Machinery Equipment'
 
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 df[sector] = 0
 
@@ -1421,17 +1428,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Physical outp
 ## Textiles and leather
 sector = 'Textiles and leather'
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 df[sector] = 0
 
@@ -1472,17 +1479,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Physical outp
 
 sector = 'Wood and wood products'
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 df[sector] = 0
 
@@ -1524,17 +1531,17 @@ df.loc[sources,sector] = df.loc[sources,sector]*conv_factor/s_out['Physical outp
 
 sector = 'Other Industrial Sectors'
 # read the input sheets
-excel_fec = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
-                      index_col=0,header=0,squeeze=True)
+excel_fec = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_fec',
+                   index_col=0,header=0,squeeze=True)
 
-excel_ued = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
-                      index_col=0,header=0,squeeze=True)
+excel_ued = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_ued',
+                   index_col=0,header=0,squeeze=True)
 
-excel_out = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
-                      index_col=0,header=0,squeeze=True)
+excel_out = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector],
+                   index_col=0,header=0,squeeze=True)
 
-excel_emi = pd.read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
-                      index_col=0,header=0,squeeze=True) # the emission sheet
+excel_emi = read_excel('{}/JRC-IDEES-2015_Industry_{}.xlsx'.format(base_dir,country), sheet_name=sub_sheet_name_dict[sector]+'_emi',
+                   index_col=0,header=0,squeeze=True) # the emission sheet
 
 df[sector] = 0
 
@@ -2,14 +2,24 @@
 # Build mapping between grid cells and population (total, urban, rural)
 
 import atlite
+import pyproj
+import numpy as np
 import pandas as pd
 import xarray as xr
-
-from vresutils import shapes as vshapes
+import scipy as sp, scipy.sparse
 
 import geopandas as gpd
 
 
+def grid_cell_areas(grid_cells, fr=pyproj.Proj(proj='longlat'), to=pyproj.Proj(proj='aea', lat_1=33., lat_2=72.)):
+    """Area of the grid cells in m^2 in the same equal-area projection as
+    vresutils.shapes.area, reprojecting the corners of all cells at once."""
+
+    coords = np.array([c.exterior.coords for c in grid_cells])
+    x, y = pyproj.transform(fr, to, coords[...,0], coords[...,1])
+    return np.abs((x[:,:-1]*y[:,1:] - x[:,1:]*y[:,:-1]).sum(axis=1))/2.
+
+
 if 'snakemake' not in globals():
     from vresutils import Dict
     import yaml
@@ -54,42 +64,42 @@ urban_fraction.loc[missing] = urban_fraction[reference].mean()
 pop_cells = pd.Series(I.dot(nuts3['pop']))
 
 #in km^2
-cell_areas = pd.Series(cutout.grid_cells()).map(vshapes.area)/1e6
+cell_areas = pd.Series(grid_cell_areas(grid_cells))/1e6
 
 #pop per km^2
 density_cells = pop_cells/cell_areas
 
 
-#rural or urban population in grid cell
-pop_rural = pd.Series(0.,density_cells.index)
-pop_urban = pd.Series(0.,density_cells.index)
-
-for ct in countries:
-    print(ct,urban_fraction[ct])
-
-    indicator_nuts3_ct = pd.Series(0.,nuts3.index)
-    indicator_nuts3_ct[nuts3.index[nuts3.country==ct]] = 1.
-
-    indicator_cells_ct = pd.Series(Iinv.T.dot(indicator_nuts3_ct))
+# Share of each grid cell in each country, cells at borders belong to
+# several countries; one entry per pair of grid cell and country
+country_codes = pd.Categorical(nuts3.country, categories=countries).codes
+indicator_nuts3_countries = sp.sparse.csr_matrix((np.ones(len(nuts3)), (np.arange(len(nuts3)), country_codes)),
+                                                 shape=(len(nuts3), len(countries)))
+indicator_cells_countries = sp.sparse.coo_matrix(Iinv.T.dot(indicator_nuts3_countries))
+indicator_cells_countries.eliminate_zeros()
 
-    density_cells_ct = indicator_cells_ct*density_cells
+cell = indicator_cells_countries.row
+ct = indicator_cells_countries.col
+share = indicator_cells_countries.data
 
-    pop_cells_ct = indicator_cells_ct*pop_cells
+density_pairs = share*density_cells.values[cell]
+pop_pairs = share*pop_cells.values[cell]
 
-    #correct for imprecision of Iinv*I
-    pop_ct = nuts3['pop'][indicator_nuts3_ct.index[indicator_nuts3_ct == 1.]].sum()
-    pop_cells_ct = pop_cells_ct*pop_ct/pop_cells_ct.sum()
+#correct for imprecision of Iinv*I
+pop_ct = nuts3['pop'].groupby(nuts3.country).sum().reindex(countries).values
+pop_pairs = pop_pairs*pop_ct[ct]/np.bincount(ct, weights=pop_pairs, minlength=len(countries))[ct]
 
-    # The first low density grid cells to reach rural fraction are rural
-    index_from_low_d_to_high_d = density_cells_ct.sort_values().index
-    pop_ct_rural_b = pop_cells_ct[index_from_low_d_to_high_d].cumsum()/pop_cells_ct.sum() < (1-urban_fraction[ct])
-    pop_ct_urban_b = ~pop_ct_rural_b
+# The first low density grid cells to reach rural fraction are rural
+order = np.lexsort((density_pairs, ct))
+cell, ct, pop_pairs = cell[order], ct[order], pop_pairs[order]
+pop_cumsum = pd.Series(pop_pairs).groupby(ct).cumsum().values
+rural_b = pop_cumsum/np.bincount(ct, weights=pop_pairs, minlength=len(countries))[ct] < (1-urban_fraction[countries].values)[ct]
 
-    pop_ct_rural_b[indicator_cells_ct==0.] = False
-    pop_ct_urban_b[indicator_cells_ct==0.] = False
-
-    pop_rural += pop_cells_ct.where(pop_ct_rural_b,0.)
-    pop_urban += pop_cells_ct.where(pop_ct_urban_b,0.)
+#rural or urban population in grid cell
+pop_rural = pd.Series(np.bincount(cell[rural_b], weights=pop_pairs[rural_b], minlength=len(density_cells)),
+                      density_cells.index)
+pop_urban = pd.Series(np.bincount(cell[~rural_b], weights=pop_pairs[~rural_b], minlength=len(density_cells)),
+                      density_cells.index)
 
 pop_cells = {"total" : pop_cells}
 
@@ -0,0 +1,140 @@
+"""Build heat demand, air and soil temperature and solar thermal profiles
+for the total, rural and urban population layouts in a single pass over
+the weather cutout.
+
+Each monthly cutout file is read once, each conversion is run once on it
+and the result is aggregated to the buses for all population layouts,
+instead of running a separate atlite conversion per profile and layout.
+The results are the same as from cutout.heat_demand, cutout.temperature,
+cutout.soil_temperature and cutout.solar_thermal.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import inspect
+
+import atlite
+import pandas as pd
+import xarray as xr
+import scipy.sparse
+import helper
+
+from atlite.convert import (convert_heat_demand, convert_temperature,
+                            convert_soil_temperature, convert_solar_thermal)
+from atlite.pv.orientation import get_orientation
+
+if 'snakemake' not in globals():
+    from vresutils import Dict
+    import yaml
+    snakemake = Dict()
+    with open('config.yaml') as f:
+        snakemake.config = yaml.safe_load(f)
+    snakemake.wildcards = Dict()
+    snakemake.input = Dict()
+    snakemake.output = Dict()
+
+# convert_profiles repeats the loop over the monthly cutout files of
+# cutout.convert_and_aggregate, which is the same in these versions
+atlite_versions = ["0.0.2", "0.0.3"]
+
+items = ["total", "rural", "urban"]
+
+solar_thermal_angle = 45.
+
+
+def convert_defaults(func):
+    """Return the default keyword arguments of the atlite cutout method
+    func, which it passes to its conversion function."""
+
+    return {k : p.default for k, p in inspect.signature(func).parameters.items()
+            if p.default is not inspect.Parameter.empty}
+
+
+def profile_conversions():
+    """Return the conversion function, its keyword arguments and whether
+    the layout matrix is normed to average over each region, for each
+    output, with the arguments of cutout.heat_demand, cutout.temperature,
+    cutout.soil_temperature and cutout.solar_thermal."""
+
+    #should clearsky_model be "simple" or "enhanced"?
+    solar_thermal = dict(convert_defaults(atlite.convert.solar_thermal),
+                         orientation=get_orientation({'slope': solar_thermal_angle,
+                                                      'azimuth': 180.}),
+                         clearsky_model="simple")
+
+    return {"heat_demand" : (convert_heat_demand,
+                             convert_defaults(atlite.convert.heat_demand),
+                             False),
+            "temp_air" : (convert_temperature, {}, True),
+            "temp_soil" : (convert_soil_temperature, {}, True),
+            "solar_thermal" : (convert_solar_thermal, solar_thermal, True)}
+
+
+def aggregate(da, matrix, index):
+    """Aggregate da to the rows of the stacked matrices of all layouts
+    in a single product and split the result by layout."""
+
+    da = da.stack(spatial=('y', 'x')).transpose('spatial', 'time')
+    values = matrix.dot(da.values)
+    n = len(index)
+    return {item : xr.DataArray(values[i*n:(i+1)*n], [index, da.coords['time']])
+            for i, item in enumerate(items)}
+
+
+def convert_profiles(cutout, matrices, index):
+    """Convert each monthly file of cutout once per output and aggregate
+    it to index with the stacked layout matrices, unnormed and normed.
+    Return the profiles by output and layout."""
+
+    assert atlite.__version__ in atlite_versions, \
+        "atlite {} is not supported, use one of {}".format(atlite.__version__, atlite_versions)
+    assert cutout.prepared, "The cutout has to be prepared first."
+
+    profiles = profile_conversions()
+    results = {(name, item) : [] for name in profiles for item in items}
+
+    for ym in cutout.coords['year-month'].to_index():
+        logger.info(f"Converting weather data for {ym}")
+
+        with xr.open_dataset(cutout.datasetfn(ym)) as ds:
+            if 'view' in cutout.meta.attrs:
+                ds = ds.sel(**cutout.meta.attrs['view'])
+
+            for name, (convert_func, kwargs, normed) in profiles.items():
+                da = convert_func(ds, **kwargs)
+                for item, aggregated in aggregate(da, matrices[normed], index).items():
+                    results[name, item].append(aggregated)
+
+    return {key : xr.concat(monthly, dim='time') for key, monthly in results.items()}
+
+
+if __name__ == "__main__":
+
+    time = pd.date_range(freq='m', **snakemake.config['snapshots'])
+    params = dict(years=slice(*time.year[[0, -1]]), months=slice(*time.month[[0, -1]]))
+
+    # a full single weather year for the profiles stacked over weather years
+    weather_year = snakemake.wildcards.get('weather_year')
+    if weather_year is not None:
+        params = dict(years=slice(int(weather_year), int(weather_year)), months=slice(1, 12))
+
+    cutout = atlite.Cutout(snakemake.config['atlite']['cutout_name'],
+                           cutout_dir=snakemake.config['atlite']['cutout_dir'],
+                           **params)
+
+    I, clustered_busregions_index = helper.load_indicator_matrix(snakemake.input.indicator_matrix,
+                                                                 snakemake.input.regions_onshore,
+                                                                 cutout)
+
+    pop_layouts = {item : xr.open_dataarray(snakemake.input['pop_layout_'+item]) for item in items}
+
+    # the matrices of all layouts stacked on top of each other, unnormed and normed
+    matrices = {normed : scipy.sparse.vstack([helper.population_weighted_matrix(I, pop_layouts[item], normed=normed).T
+                                              for item in items]).tocsr()
+                for normed in [False, True]}
+
+    results = convert_profiles(cutout, matrices, clustered_busregions_index)
+
+    for (name, item), profile in results.items():
+        profile.to_netcdf(snakemake.output[name + "_" + item])
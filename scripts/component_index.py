@@ -0,0 +1,165 @@
+"""Index of the carrier, location, heat system, technology and build year
+of network components.
+
+Components are named after their location, heat system, technology and
+build year, e.g. "DE0 0 urban central gas CHP electric-2030", and were
+selected by scanning these names with string operations, once per
+component and selection. ``get_component_index`` parses the names once
+per network into the location, heat system, technology and build year
+and returns them with the carrier as frame of categoricals, cached on
+the network, so that selections compare the integer codes of the
+components and test strings only once per category with ``contains``.
+
+The index is stored in the network files by ``export_network`` as the
+integer codes of each attribute and a table of its categories, which are
+compressed unlike object columns, and ``load_network`` restores it into
+the cache, so that it is not parsed again after loading.
+``add_component_index`` adds the attributes as columns for grouping,
+e.g. in make_summary; ``export_network`` leaves these columns out.
+"""
+
+import numpy as np
+import pandas as pd
+
+heat_systems = ["residential rural", "services rural",
+                "residential urban decentral", "services urban decentral",
+                "urban central"]
+
+index_attrs = ["location", "heat_system", "technology"]
+
+
+
+def indexed_components(n):
+    """Return the component classes of n with an index."""
+
+    return n.one_port_components | n.branch_components | {"Bus"}
+
+
+def parse_names(names):
+    """Split component names into location, heat system, technology and
+    build year. As in make_summary, the location is the name up to the
+    first space after its fourth character, e.g. "DE0 0", or empty if
+    there is none; the build year is the suffix "-YYYY" of myopic runs."""
+
+    names = pd.Series(names, index=names, dtype=object)
+
+    parsed = names.str.extract(r"^(?P<location>.{4}[^ ]*) (?P<rest>.*)$")
+    parsed["location"] = parsed.location.fillna("")
+    rest = parsed.pop("rest").fillna(names)
+
+    parts = rest.str.extract(r"^(?:(?P<heat_system>{}) )?(?P<technology>.*?)(?:-(?P<build_year>\d{{4}}))?$"
+                             .format("|".join(heat_systems)))
+    parsed["heat_system"] = parts.heat_system.fillna("")
+    parsed["technology"] = parts.technology
+    parsed["build_year"] = parts.build_year.astype(float)
+
+    return parsed
+
+
+def add_component_index(n):
+    """Add the location, heat system and technology of the component
+    index to all components which do not have them yet, e.g. after adding
+    components. The location of buses is the attribute set on building
+    them and left as it is."""
+
+    for c in n.iterate_components(indexed_components(n)):
+        df = c.df
+        attrs = [attr for attr in index_attrs if not (c.name == "Bus" and attr == "location")]
+
+        missing = df.index if any(attr not in df for attr in attrs) else df.index[df[attrs].isna().any(axis=1)]
+        if missing.empty:
+            continue
+
+        index = get_component_index(n, c.name)
+        for attr in attrs:
+            values = index.loc[missing, attr].astype(object)
+            if attr not in df:
+                df[attr] = np.nan
+            df.loc[missing, attr] = df.loc[missing, attr].fillna(values)
+
+
+def get_component_index(n, c):
+    """Return the carrier, location, heat system, technology and build
+    year of the components of class c as frame of categoricals. The frame
+    is cached on the network until components of class c are added or
+    removed, so later changes of these attributes are not reflected."""
+
+    df = n.df(c)
+
+    cache = n.__dict__.setdefault("_component_index", {})
+    if c in cache and cache[c][0] is df.index:
+        return cache[c][1]
+
+    # names are only parsed for attributes which are missing, e.g. the
+    # build year of components without such an attribute
+    parsed = None
+    if "build_year" not in df or any(attr not in df or df[attr].isna().any()
+                                     for attr in index_attrs):
+        parsed = parse_names(df.index)
+
+    index = pd.DataFrame(index=df.index)
+    index["carrier"] = pd.Categorical(df["carrier"].values if "carrier" in df
+                                      else np.full(len(df), np.nan))
+    for attr in index_attrs + ["build_year"]:
+        if attr not in df:
+            values = parsed[attr]
+        elif parsed is not None:
+            values = df[attr].astype(parsed[attr].dtype).fillna(parsed[attr])
+        else:
+            values = df[attr]
+        index[attr] = pd.Categorical(values.values)
+
+    cache[c] = (df.index, index)
+    return index
+
+
+def index_variables(n):
+    """Return the component index of n as variables of a network dataset,
+    the integer codes of each attribute along the components of a class,
+    named e.g. component_index_links_technology, and its categories."""
+
+    variables = {}
+    for c in indexed_components(n):
+        df = n.df(c)
+        if df.empty:
+            continue
+        list_name = n.components[c]["list_name"]
+        for attr, s in get_component_index(n, c).items():
+            name = "component_index_{}_{}".format(list_name, attr)
+            variables[name] = (list_name + "_i", s.cat.codes.values)
+            variables[name + "_categories"] = (name + "_categories", np.asarray(s.cat.categories))
+    return variables
+
+
+def load_component_index(n, ds):
+    """Restore the component index stored in the network dataset ds into
+    the cache of n, for the classes whose components in n are those of
+    ds."""
+
+    cache = n.__dict__.setdefault("_component_index", {})
+    for c in indexed_components(n):
+        df = n.df(c)
+        list_name = n.components[c]["list_name"]
+        names = {attr : "component_index_{}_{}".format(list_name, attr)
+                 for attr in ["carrier"] + index_attrs + ["build_year"]}
+        if df.empty or any(name not in ds for name in names.values()) \
+           or not ds.indexes[list_name + "_i"].equals(df.index):
+            continue
+
+        index = pd.DataFrame(index=df.index)
+        for attr, name in names.items():
+            index[attr] = pd.Categorical.from_codes(ds[name].values, ds[name + "_categories"].values)
+        cache[c] = (df.index, index)
+
+
+def _category_mask(s, func):
+    # evaluate func once per category; code -1 of missing values picks False
+    mask = np.append(np.asarray([func(v) for v in s.cat.categories], dtype=bool), False)
+    return pd.Series(mask[s.cat.codes.values], index=s.index)
+
+
+def contains(s, *patterns):
+    """Mask of the values of the categorical Series s which contain all
+    patterns."""
+
+    return _category_mask(s, lambda v: all(p in v for p in patterns))
@@ -0,0 +1,100 @@
+"""Cache of parsed Excel sheets.
+
+Parsing the Eurostat and JRC-IDEES workbooks dominates the runtime of
+the rules which read them, and most sheets are read by several rules
+and in every run. Each sheet is parsed once with pandas.read_excel and
+the result is pickled into the frame cache, keyed by the hash of the
+workbook and the keyword arguments of the call. Workbooks missing from
+the cache can be parsed up front in a pool of processes with prefetch.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import functools
+import multiprocessing as mp
+from collections import OrderedDict
+
+import pandas as pd
+
+from frame_cache import hash_file, make_key, load_object, store_object, has_entry
+
+
+@functools.lru_cache()
+def _hash_workbook(io, mtime_ns, size):
+    return hash_file(io)
+
+
+def _key(io, kwargs):
+    # the workbook is only hashed once per process for all its sheets
+    stat = os.stat(io)
+    return make_key([], dict(kwargs, workbook=_hash_workbook(os.path.abspath(io),
+                                                             stat.st_mtime_ns,
+                                                             stat.st_size)))
+
+
+def _parse(io, kwargs):
+    """Parse the sheets requested by the list of kwargs from workbook io,
+    opening the workbook only once."""
+
+    with pd.ExcelFile(io) as xls:
+        return [pd.read_excel(xls, **kw) for kw in kwargs]
+
+
+def _parse_and_store(args):
+    io, kwargs, cache_config = args
+    logger.info(f"Parsing {len(kwargs)} sheet(s) of {io}")
+    for kw, result in zip(kwargs, _parse(io, kwargs)):
+        store_object(cache_config['directory'], _key(io, kw), result,
+                     cache_config.get('max_size_mb'))
+
+
+def read_excel(io, sheet_name=0, cache_config=None, **kwargs):
+    """Drop-in replacement for pandas.read_excel on a workbook path io,
+    which returns the parsed sheet from the cache if cache_config is
+    enabled."""
+
+    kwargs['sheet_name'] = sheet_name
+
+    if cache_config is None or not cache_config['enable']:
+        return pd.read_excel(io, **kwargs)
+
+    key = _key(io, kwargs)
+    result = load_object(cache_config['directory'], key)
+    if result is None:
+        result = _parse(io, [kwargs])[0]
+        store_object(cache_config['directory'], key, result,
+                     cache_config.get('max_size_mb'))
+
+    return result
+
+
+def prefetch(requests, cache_config=None, processes=1):
+    """Parse the sheets in requests, a list of (io, kwargs) with the
+    arguments of read_excel, which are not cached yet, in a pool of
+    processes with one task per workbook."""
+
+    if cache_config is None or not cache_config['enable']:
+        return
+
+    missing = OrderedDict()
+    for io, kwargs in requests:
+        kwargs = dict(kwargs)
+        kwargs.setdefault('sheet_name', 0)
+        if kwargs in missing.get(io, []):
+            continue
+        if has_entry(cache_config['directory'], _key(io, kwargs)):
+            continue
+        missing.setdefault(io, []).append(kwargs)
+
+    if not missing:
+        return
+
+    tasks = [(io, kwargs, cache_config) for io, kwargs in missing.items()]
+    if processes > 1 and len(tasks) > 1:
+        with mp.Pool(processes=min(processes, len(tasks))) as pool:
+            pool.map(_parse_and_store, tasks)
+    else:
+        for task in tasks:
+            _parse_and_store(task)
@@ -0,0 +1,170 @@
+"""Content-addressed on-disk cache for pandas objects.
+
+Each entry is an HDF5 file named after a hash of the input files and
+the configuration settings which determine its content. Objects which
+HDF5 stores inefficiently, like frames with object columns parsed from
+spreadsheets, are pickled instead. Entries are evicted
+least-recently-used first once the cache exceeds its size cap.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import hashlib
+import tempfile
+
+import pandas as pd
+
+
+def hash_file(fn, chunk_size=2**20):
+    """Return the sha256 hex digest of the content of file fn."""
+
+    h = hashlib.sha256()
+    with open(fn, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(files, settings=None):
+    """Hash the content of files (in order) together with a
+    JSON-serialisable dictionary of settings."""
+
+    h = hashlib.sha256()
+    for fn in files:
+        h.update(hash_file(fn).encode())
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+suffixes = (".h5", ".pkl")
+
+
+def _entry_path(directory, key, suffix=".h5"):
+    return os.path.join(directory, key + suffix)
+
+
+def _write_entry(directory, key, suffix, write, max_size_mb):
+    """Call write on a temporary file which then replaces the entry
+    atomically, so that parallel jobs never see partially written
+    entries, and evict old entries."""
+
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_fn = tempfile.mkstemp(suffix=suffix + ".tmp", dir=directory)
+    os.close(fd)
+    try:
+        write(tmp_fn)
+        os.replace(tmp_fn, _entry_path(directory, key, suffix))
+    finally:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+
+    if max_size_mb is not None:
+        evict(directory, max_size_mb)
+
+
+def load_frames(directory, key):
+    """Return the dictionary of frames stored under key, or None if
+    there is no such entry. A hit marks the entry as recently used."""
+
+    fn = _entry_path(directory, key)
+    if not os.path.isfile(fn):
+        return None
+
+    try:
+        with pd.HDFStore(fn, mode="r") as store:
+            frames = {k.lstrip("/"): store[k] for k in store.keys()}
+    except Exception:
+        logger.warning(f"Could not read cache entry {fn}, ignoring it.")
+        return None
+
+    os.utime(fn)
+    return frames
+
+
+def store_frames(directory, key, frames, max_size_mb=None):
+    """Store the dictionary of frames under key and evict least recently
+    used entries until the cache is smaller than max_size_mb."""
+
+    def write(fn):
+        with pd.HDFStore(fn, mode="w") as store:
+            for k, df in frames.items():
+                store.put(k, df, format="fixed")
+
+    _write_entry(directory, key, ".h5", write, max_size_mb)
+
+
+def load_object(directory, key):
+    """Return the pickled object stored under key, or None if there is
+    no such entry. A hit marks the entry as recently used."""
+
+    fn = _entry_path(directory, key, ".pkl")
+    if not os.path.isfile(fn):
+        return None
+
+    try:
+        obj = pd.read_pickle(fn)
+    except Exception:
+        logger.warning(f"Could not read cache entry {fn}, ignoring it.")
+        return None
+
+    os.utime(fn)
+    return obj
+
+
+def store_object(directory, key, obj, max_size_mb=None):
+    """Pickle obj under key and evict least recently used entries until
+    the cache is smaller than max_size_mb."""
+
+    _write_entry(directory, key, ".pkl", lambda fn: pd.to_pickle(obj, fn),
+                 max_size_mb)
+
+
+def has_entry(directory, key):
+    """Return whether there is an entry for key."""
+
+    return any(os.path.isfile(_entry_path(directory, key, suffix))
+               for suffix in suffixes)
+
+
+def evict(directory, max_size_mb):
+    """Remove least recently used entries until the total size of the
+    cache in directory is below max_size_mb."""
+
+    entries = []
+    for fn in os.listdir(directory):
+        if not fn.endswith(suffixes):
+            continue
+        fn = os.path.join(directory, fn)
+        try:
+            stat = os.stat(fn)
+        except FileNotFoundError:
+            # removed by a parallel job in the meantime
+            continue
+        entries.append((stat.st_mtime, stat.st_size, fn))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, fn in entries:
+        if total <= max_size_mb*1e6:
+            break
+        logger.info(f"Evicting cache entry {fn}")
+        try:
+            os.remove(fn)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def clear_cache(directory):
+    """Remove all entries from the cache in directory."""
+
+    if not os.path.isdir(directory):
+        return
+
+    for fn in os.listdir(directory):
+        if fn.endswith(suffixes) or fn.endswith(tuple(suffix + ".tmp" for suffix in suffixes)):
+            os.remove(os.path.join(directory, fn))
@@ -2,6 +2,15 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import hashlib
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import scipy.sparse
+
+from frame_cache import hash_file
+
 #https://stackoverflow.com/questions/20833344/fix-invalid-polygon-in-shapely
 #https://stackoverflow.com/questions/13062334/polygon-intersection-error-in-shapely-shapely-geos-topologicalerror-the-opera
 #https://shapely.readthedocs.io/en/latest/manual.html#object.buffer
@@ -13,3 +22,78 @@ are valid before being written in pypsa-eur/scripts/cluster_network.py"""
         if not p.is_valid:
             logger.warning(f'Clustered region {i} had an invalid geometry, fixing using zero buffer.')
             geometries[i] = p.buffer(0)
+
+
+def read_busregions(fn):
+    """Read the geometries of the bus regions in fn as Series indexed by
+bus, with invalid geometries fixed."""
+
+    busregions_as_geopd = gpd.read_file(fn).set_index('name', drop=True)
+    busregions = pd.Series(busregions_as_geopd.geometry, index=busregions_as_geopd.index)
+    clean_invalid_geometries(busregions)
+    return busregions
+
+
+def indicator_matrix_key(regions_fn, cutout):
+    """Hash of the regions file and the grid of the cutout, which together
+determine the indicator matrix."""
+
+    h = hashlib.sha256(hash_file(regions_fn).encode())
+    h.update(np.ascontiguousarray(cutout.grid_coordinates(), dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def save_indicator_matrix(fn, I, index, key):
+    """Store the indicator matrix I of the regions in index as sparse CSR
+matrix in the npz file fn, together with its key."""
+
+    I = scipy.sparse.csr_matrix(I)
+    np.savez_compressed(fn, data=I.data, indices=I.indices, indptr=I.indptr,
+                        shape=np.array(I.shape), index=np.asarray(index, dtype=str),
+                        key=np.array(key))
+
+
+def load_indicator_matrix(fn, regions_fn, cutout):
+    """Load the indicator matrix written by build_indicator_matrix.py
+from fn and return it as CSR matrix together with the index of its
+regions. It is recomputed if it was built for different regions or
+for a cutout with a different grid."""
+
+    key = indicator_matrix_key(regions_fn, cutout)
+
+    with np.load(fn) as f:
+        if str(f["key"]) == key:
+            I = scipy.sparse.csr_matrix((f["data"], f["indices"], f["indptr"]),
+                                        shape=tuple(f["shape"]))
+            return I, pd.Index(f["index"], name="name")
+
+    logger.warning(f'Indicator matrix {fn} does not match {regions_fn} and the cutout grid, recomputing it.')
+    busregions = read_busregions(regions_fn)
+    return scipy.sparse.csr_matrix(cutout.indicatormatrix(busregions)), busregions.index
+
+
+def population_weighted_matrix(I, pop_layout, normed=False):
+    """Return the sparse (cells x regions) matrix which weights the cells
+of each region in the indicator matrix I by the population of the region
+in pop_layout, as matrix for the atlite conversions. If normed, each column
+is divided by its sum, so that conversions return averages.
+
+Equivalent to I.T.dot(diag(I.dot(pop))), without the dense diagonal and
+product matrices."""
+
+    pop = I.dot(pop_layout.stack(spatial=('y', 'x')).values)
+
+    M = scipy.sparse.csc_matrix(I.T, dtype=float, copy=True)
+    nnz_per_region = np.diff(M.indptr)
+    M.data *= np.repeat(pop, nnz_per_region)
+
+    if normed:
+        nonzero_sum = np.asarray(M.sum(axis=0)).ravel()
+        nonzero_sum[nonzero_sum == 0.] = 1.
+        M.data /= np.repeat(nonzero_sum, nnz_per_region)
+
+    # like the conversion of the dense matrix, so that cells without data
+    # do not contribute to unpopulated regions
+    M.eliminate_zeros()
+
+    return M
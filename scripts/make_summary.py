@@ -1,8 +1,20 @@
 
 from six import iteritems
 
+import os
+
 import sys
 
+import json
+
+import inspect
+
+import hashlib
+
+import multiprocessing as mp
+
+from functools import reduce, lru_cache
+
 import pandas as pd
 
 import numpy as np
@@ -11,7 +23,15 @@ import pypsa
 
 from vresutils.costdata import annuity
 
-from prepare_sector_network import generate_periodic_profiles, prepare_costs
+from prepare_sector_network import generate_periodic_profiles
+from prepare_costs import load_costs
+
+import component_index
+import network_io
+import prepare_costs
+from frame_cache import hash_file, make_key, load_frames, store_frames
+from component_index import add_component_index, parse_names
+from network_io import load_network
 
 import yaml
 
@@ -38,6 +58,17 @@ override_component_attrs["Link"].loc["p4"] = ["series","MW",0.,"4th bus output",
 override_component_attrs["StorageUnit"].loc["p_dispatch"] = ["series","MW",0.,"Storage discharging.","Output"]
 override_component_attrs["StorageUnit"].loc["p_store"] = ["series","MW",0.,"Storage charging.","Output"]
 
+#the time-varying attributes used by the summaries, the others are not read
+summary_series = {"Bus" : ["marginal_price"],
+                  "Generator" : ["p", "p_max_pu"],
+                  "Load" : ["p", "p_set"],
+                  "StorageUnit" : ["p"],
+                  "Store" : ["p", "e"],
+                  "ShuntImpedance" : ["p"],
+                  "Line" : ["p0", "p1"],
+                  "Transformer" : ["p0", "p1"],
+                  "Link" : ["p0", "p1", "p2", "p3", "p4"]}
+
 
 
 
@@ -47,17 +78,8 @@ def assign_carriers(n):
 
 
 def assign_locations(n):
-    for c in n.iterate_components(n.one_port_components|n.branch_components):
-
-        ifind = pd.Series(c.df.index.str.find(" ",start=4),c.df.index)
-
-        for i in ifind.unique():
-            names = ifind.index[ifind == i]
-
-            if i == -1:
-                c.df.loc[names,'location'] = ""
-            else:
-                c.df.loc[names,'location'] = names.str[:i]
+    #networks exported before the component index are parsed here
+    add_component_index(n)
 
 def calculate_nodal_cfs(n,label,nodal_cfs):
     #Beware this also has extraneous locations for country (e.g. biomass) or continent-wide (e.g. fossil gas/oil) stuff
@@ -541,27 +563,131 @@ outputs = ["nodal_costs",
            "metrics",
            ]
 
-def make_summaries(networks_dict):
+summary_levels = ["cluster","lv","opt","planning_horizon"]
 
-    columns = pd.MultiIndex.from_tuples(networks_dict.keys(),names=["cluster","lv","opt","planning_horizon"])
+def calculate_summaries(item):
+    """Load a single network and calculate all outputs for it, as frames
+    with a single column for its label."""
 
-    df = {}
+    label, filename = item
+    print(label, filename)
 
-    for output in outputs:
-        df[output] = pd.DataFrame(columns=columns,dtype=float)
+    n = load_network(filename, series=summary_series,
+                     override_component_attrs=override_component_attrs)
+
+    assign_carriers(n)
+    assign_locations(n)
+
+    columns = pd.MultiIndex.from_tuples([label],names=summary_levels)
+
+    return {output : globals()["calculate_" + output](n, label, pd.DataFrame(columns=columns,dtype=float))
+            for output in outputs}
+
+def read_network_hashes(directory):
+    """Return the content hashes of networks recorded in the fragment
+    cache, as {path : [mtime_ns, size, hash]}."""
+
+    fn = os.path.join(directory, "network_hashes.json")
+    if not os.path.isfile(fn):
+        return {}
 
-    for label, filename in iteritems(networks_dict):
-        print(label, filename)
+    try:
+        with open(fn) as f:
+            return json.load(f)
+    except ValueError:
+        return {}
 
-        n = pypsa.Network(filename,
-                          override_component_attrs=override_component_attrs)
+def write_network_hashes(directory, hashes):
 
+    os.makedirs(directory, exist_ok=True)
 
-        assign_carriers(n)
-        assign_locations(n)
+    fn = os.path.join(directory, "network_hashes.json")
+    tmp_fn = fn + ".{}.tmp".format(os.getpid())
+    with open(tmp_fn, "w") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_fn, fn)
 
-        for output in outputs:
-            df[output] = globals()["calculate_" + output](n, label, df[output])
+@lru_cache(maxsize=None)
+def code_hash():
+    """Hash of the code the summaries depend on: the source of this script
+    and of the modules it imports from this repository, the component
+    attributes the networks are loaded with and the PyPSA version."""
+
+    # run by snakemake, this script is preceded by a preamble with the
+    # inputs of the job, which must not change the hash
+    code = inspect.getsource(sys.modules[__name__]).split("snakemake preamble end")[-1]
+    code += "".join(inspect.getsource(m) for m in [component_index, network_io, prepare_costs])
+    code += inspect.getsource(generate_periodic_profiles)
+    code += pd.concat(override_component_attrs).to_csv()
+    code += pypsa.__version__
+
+    return hashlib.sha256(code.encode()).hexdigest()
+
+def fragment_key(label, filename, hashes):
+    """Hash of the content of the network file, its label and the code
+    calculating the outputs from it. Networks are only hashed again if
+    their modification time or size differ from the record in hashes."""
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    if hashes.get(path, [None, None])[:2] != [stat.st_mtime_ns, stat.st_size]:
+        hashes[path] = [stat.st_mtime_ns, stat.st_size, hash_file(path)]
+
+    settings = {"network" : hashes[path][2],
+                "label" : list(label),
+                "outputs" : outputs,
+                "series" : summary_series,
+                "code" : code_hash()}
+
+    return make_key([], settings)
+
+def make_summaries(networks_dict, processes=1, cache_config=None):
+    """Calculate the summaries of all networks, loading each network once
+    in one of processes worker processes, which bounds the number of
+    networks in memory.
+
+    If the fragment cache in cache_config is enabled, the summaries of
+    each network are stored there and only calculated again for new or
+    modified networks."""
+
+    columns = pd.MultiIndex.from_tuples(networks_dict.keys(),names=summary_levels)
+
+    cache = cache_config is not None and cache_config["enable"]
+
+    summaries = {}
+    if cache:
+        hashes = read_network_hashes(cache_config["directory"])
+        keys = {label : fragment_key(label, filename, hashes)
+                for label, filename in iteritems(networks_dict)}
+        write_network_hashes(cache_config["directory"], hashes)
+
+        for label, key in iteritems(keys):
+            fragment = load_frames(cache_config["directory"], key)
+            if fragment is not None:
+                summaries[label] = fragment
+
+    missing = [item for item in iteritems(networks_dict) if item[0] not in summaries]
+    print("Calculating summaries for {} of {} networks".format(len(missing), len(networks_dict)))
+
+    if processes > 1 and len(missing) > 1:
+        with mp.Pool(min(processes, len(missing))) as pool:
+            calculated = pool.map(calculate_summaries, missing, chunksize=1)
+    else:
+        calculated = [calculate_summaries(item) for item in missing]
+
+    for (label, filename), summary in zip(missing, calculated):
+        summaries[label] = summary
+        if cache:
+            store_frames(cache_config["directory"], keys[label], summary,
+                         cache_config["max_size_mb"])
+
+    df = {}
+
+    for output in outputs:
+        frames = [summaries[label][output] for label in networks_dict]
+        # same order of rows as when extending the summaries network by network
+        index = reduce(lambda index, frame: frame.index.union(index), frames[1:], frames[0].index)
+        df[output] = pd.concat(frames, axis=1).reindex(index=index, columns=columns)
 
     return df
 
@@ -588,11 +714,12 @@ if __name__ == "__main__":
         snakemake.config["planning_horizons"] = ['2020', '2030', '2040', '2050']
         snakemake.input = Dict()
         snakemake.input['heat_demand_name'] = 'data/heating/daily_heat_demand.h5'
-        snakemake.input['costs'] = snakemake.config['costs_dir'] + "costs_{}.csv".format(snakemake.config['scenario']['planning_horizons'][0])
+        snakemake.input['costs'] = "resources/costs_{}.h5".format(snakemake.config['scenario']['planning_horizons'][0])
         snakemake.output = Dict()
         for item in outputs:
             snakemake.output[item] = snakemake.config['summary_dir'] + '/{name}/csvs/{item}.csv'.format(name=snakemake.config['run'],item=item)
         snakemake.output['cumulative_cost'] = snakemake.config['summary_dir'] + '/{name}/csvs/cumulative_cost.csv'.format(name=snakemake.config['run'])
+        snakemake.threads = 1
     networks_dict = {(cluster, lv, opt+sector_opt, planning_horizon) :
                      snakemake.config['results_dir'] + snakemake.config['run'] + '/postnetworks/elec_s{simpl}_{cluster}_lv{lv}_{opt}_{sector_opt}_{planning_horizon}.nc'\
                      .format(simpl=simpl,
@@ -612,13 +739,12 @@ if __name__ == "__main__":
 
     Nyears = 1
 
-    costs_db = prepare_costs(snakemake.input.costs,
-                             snakemake.config['costs']['USD2013_to_EUR2013'],
-                             snakemake.config['costs']['discountrate'],
-                             Nyears,
-                             snakemake.config['costs']['lifetime'])
+    costs_db = load_costs(snakemake.input.costs, Nyears)
+
+    processes = min(snakemake.threads, snakemake.config['summary']['max_concurrent_networks'])
 
-    df = make_summaries(networks_dict)
+    df = make_summaries(networks_dict, processes,
+                        snakemake.config['summary']['fragment_cache'])
 
     df["metrics"].loc["total costs"] =  df["costs"].sum()
 
@@ -0,0 +1,129 @@
+"""Compressed network files and selective loading.
+
+Networks are written as NetCDF4 files in which the numeric variables are
+compressed with zlib and the time-varying data is chunked along the
+snapshots and the components, as configured under ``network_io``. The
+component index is stored as integer codes, see component_index. Stages which only need
+some of the data, e.g. make_summary, which does not use the reactive
+power, shadow prices or efficiencies over time, declare the components
+and time-varying attributes they need with ``load_network``. The file is
+opened lazily and only these variables are read from disk.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+
+import xarray as xr
+
+import pypsa
+from pypsa.io import ImporterNetCDF, _import_from_importer
+
+from component_index import index_attrs, indexed_components, index_variables, load_component_index
+
+
+def network_dataset(n, config=None):
+    """Return the dataset of n and its encoding, compressed and chunked
+    as given by the network_io config, with the chunks of single
+    time-varying variables, e.g. buses_t_marginal_price, overridden
+    under variables. The dataset does not share memory with n."""
+
+    if config is None:
+        config = {}
+    complevel = config.get('complevel', 1)
+    chunks = config.get('chunks', {})
+
+    ds = n.export_to_netcdf()
+
+    # the component index is stored as codes instead of object columns
+    derived = ["{}_{}".format(n.components[c]["list_name"], attr)
+               for c in indexed_components(n)
+               for attr in index_attrs if not (c == "Bus" and attr == "location")]
+    ds = ds.drop_vars([name for name in derived if name in ds])
+    ds = ds.assign(index_variables(n))
+
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        # variable-length strings cannot be compressed by netcdf
+        if complevel == 0 or var.dtype.kind not in "biuf" or 0 in var.shape:
+            continue
+        encoding[name] = dict(zlib=True, complevel=complevel, shuffle=True)
+        if var.dims[:1] == ("snapshots",) and var.ndim == 2:
+            var_chunks = dict(chunks, **chunks.get('variables', {}).get(name, {}))
+            encoding[name]["chunksizes"] = (min(var.shape[0], var_chunks.get('snapshots', 8760)),
+                                            min(var.shape[1], var_chunks.get('components', 32)))
+
+    return ds, encoding
+
+
+def write_dataset(ds, encoding, fn):
+    """Write ds to the netcdf file fn, which is replaced atomically, so
+    readers never see a partially written network."""
+
+    tmp_fn = fn + ".{}.tmp".format(os.getpid())
+    ds.to_netcdf(tmp_fn, encoding=encoding)
+    os.replace(tmp_fn, fn)
+
+
+def export_network(n, fn, config=None):
+    """Export n to the netcdf file fn as given by the network_io config,
+    see network_dataset."""
+
+    write_dataset(*network_dataset(n, config), fn)
+
+
+def input_series(n, components):
+    """Return the time-varying input attributes of the classes in
+    components, e.g. for copying components to another network."""
+
+    series = {}
+    for c in components:
+        attrs = n.components[c]["attrs"]
+        series[c] = list(attrs.index[attrs.type.str.contains("series") & attrs.status.str.contains("Input")])
+    return series
+
+
+def load_network(fn, components=None, series=None, override_component_attrs=None):
+    """Load the network in fn with the static attributes of the component
+    classes in components, all classes if None, and the time-varying
+    attributes in series, a dictionary of the list of attributes by
+    class, e.g. {"Bus" : ["marginal_price"]}. If series is None, all
+    time-varying attributes are loaded. Other variables are not read. The
+    component index stored in fn is restored."""
+
+    n = pypsa.Network(override_component_attrs=override_component_attrs)
+
+    if components is None and series is None:
+        n.import_from_netcdf(fn)
+        with xr.open_dataset(fn) as ds:
+            load_component_index(n, ds)
+        return n
+
+    list_names = {n.components[c]["list_name"] : c for c in n.components}
+
+    with xr.open_dataset(fn) as ds:
+        drop = []
+        for name in list(ds.variables):
+            list_name = next((l for l in list_names if name.startswith(l + "_")), None)
+            if list_name is None:
+                continue
+            c = list_names[list_name]
+            if components is not None and c not in components:
+                drop.append(name)
+            elif name.startswith(list_name + "_t_") and series is not None:
+                attr = name[len(list_name + "_t_"):]
+                # the index of the components with the time-varying attribute
+                if name in ds.coords:
+                    attr = attr[:-len("_i")]
+                if attr not in series.get(c, []):
+                    drop.append(name)
+
+        # import_from_netcdf of PyPSA 0.17 fails to log the import of a
+        # dataset without a file name, so the importer is called directly
+        with ImporterNetCDF(ds.drop_vars(drop)) as importer:
+            _import_from_importer(n, importer, basename=os.path.basename(fn))
+
+        load_component_index(n, ds)
+
+    return n
@@ -3,6 +3,8 @@ import cartopy.crs as ccrs
 from matplotlib.legend_handler import HandlerPatch
 from matplotlib.patches import Circle, Ellipse
 from make_summary import assign_carriers
+from component_index import add_component_index
+from network_io import load_network
 from plot_summary import rename_techs, preferred_order
 import numpy as np
 import pypsa
@@ -42,6 +44,16 @@ override_component_attrs["StorageUnit"].loc["p_dispatch"] = [
 override_component_attrs["StorageUnit"].loc["p_store"] = [
     "series", "MW", 0., "Storage charging.", "Output"]
 
+# the maps and series only use the power flows of the components
+flow_series = {"Generator": ["p"],
+               "Load": ["p"],
+               "StorageUnit": ["p"],
+               "Store": ["p"],
+               "ShuntImpedance": ["p"],
+               "Line": ["p0", "p1"],
+               "Transformer": ["p0", "p1"],
+               "Link": ["p0", "p1", "p2", "p3", "p4"]}
+
 
 
 # ----------------- PLOT HELPERS ---------------------------------------------
@@ -95,18 +107,10 @@ def make_legend_circles_for(sizes, scale=1.0, **kw):
 
 
 def assign_location(n):
+    add_component_index(n)
     for c in n.iterate_components(n.one_port_components | n.branch_components):
-
-        ifind = pd.Series(c.df.index.str.find(" ", start=4), c.df.index)
-
-        for i in ifind.value_counts().index:
-            # these have already been assigned defaults
-            if i == -1:
-                continue
-
-            names = ifind.index[ifind == i]
-
-            c.df.loc[names, 'location'] = names.str[:i]
+        # components without location are left out of the maps
+        c.df["location"] = c.df.location.replace("", np.nan)
 
 
 # ----------------- PLOT FUNCTIONS --------------------------------------------
@@ -685,8 +689,8 @@ if __name__ == "__main__":
                                     "/maps/{}"
                                     .format(name))
 
-    n = pypsa.Network(snakemake.input.network,
-                      override_component_attrs=override_component_attrs)
+    n = load_network(snakemake.input.network, series=flow_series,
+                     override_component_attrs=override_component_attrs)
 
     plot_map_generators(n, components=["generators", "storage_units"],
              bus_size_factor=5e6, transmission=True)
@@ -3,6 +3,8 @@
 import numpy as np
 import pandas as pd
 
+from itertools import product
+
 #allow plotting without Xwindows
 import matplotlib
 matplotlib.use('Agg')
@@ -299,9 +301,10 @@ def historical_emissions(cts):
 
 
 
-def plot_carbon_budget_distribution():
+def plot_carbon_budget_distribution(scenario, opts, o):
     """
     Plot historical carbon emissions in the EU and decarbonization path
+    o of the scenario, e.g. elec_s_37_lv1.0__3H-T-H-B-I-cb48be3
     """ 
     
     import matplotlib.gridspec as gridspec
@@ -321,10 +324,11 @@ def plot_carbon_budget_distribution():
     ax1.set_xlim([1990,snakemake.config['scenario']['planning_horizons'][-1]+1])
     
     path_cb = snakemake.config['results_dir'] + snakemake.config['run'] + '/csvs/'
-    countries=pd.read_csv(path_cb + 'countries.csv',  index_col=1) 
+    countries=pd.read_csv(path_cb + 'countries_{}.csv'.format(scenario),  index_col=1) 
     cts=countries.index.to_list()
-    e_1990 = co2_emissions_year(cts, opts, year=1990)     
-    CO2_CAP=pd.read_csv(path_cb + 'carbon_budget_distribution.csv',  
+    co2_emissions = pd.read_csv(snakemake.input.co2_emissions, index_col=[0,1])
+    e_1990 = co2_emissions_year(co2_emissions, cts, opts, year=1990)     
+    CO2_CAP=pd.read_csv(path_cb + 'carbon_budget_distribution_{}.csv'.format(scenario),  
                         index_col=0) 
     
     
@@ -367,7 +371,7 @@ def plot_carbon_budget_distribution():
                        facecolor='white', frameon=True) 
             
     path_cb_plot = snakemake.config['results_dir'] + snakemake.config['run'] + '/graphs/'             
-    plt.savefig(path_cb_plot+'carbon_budget_plot.pdf', dpi=300) 
+    plt.savefig(path_cb_plot+'carbon_budget_plot_{}.pdf'.format(scenario), dpi=300) 
 
 if __name__ == "__main__":
     # Detect running outside of snakemake and mock snakemake for testing
@@ -386,6 +390,7 @@ if __name__ == "__main__":
             snakemake.input[item] = snakemake.config['summary_dir'] + '/{name}/csvs/{item}.csv'.format(name=snakemake.config['run'],item=item)
             snakemake.output[item] = snakemake.config['summary_dir'] + '/{name}/graphs/{item}.pdf'.format(name=snakemake.config['run'],item=item)
         snakemake.input["balances"] = snakemake.config['summary_dir'] + '/{name}/csvs/supply_energy.csv'.format(name=snakemake.config['run'],item=item)
+        snakemake.input["co2_emissions"] = 'resources/co2_emissions.csv'
         snakemake.output["balances"] = snakemake.config['summary_dir'] + '/{name}/graphs/balances-energy.csv'.format(name=snakemake.config['run'],item=item)
         
         
@@ -397,8 +402,9 @@ if __name__ == "__main__":
 
     plot_balances()
     
-    for sector_opts in snakemake.config['scenario']['sector_opts']:
-        opts=sector_opts.split('-')
-        for o in opts:
+    scenarios = snakemake.config['scenario']
+    for simpl, clusters, lv, opts, sector_opts in product(*[scenarios[k] for k in ['simpl', 'clusters', 'lv', 'opts', 'sector_opts']]):
+        scenario = "elec_s{}_{}_lv{}_{}_{}".format(simpl, clusters, lv, opts, sector_opts)
+        for o in sector_opts.split('-'):
             if "cb" in o:
-                plot_carbon_budget_distribution()
+                plot_carbon_budget_distribution(scenario, sector_opts.split('-'), o)
@@ -0,0 +1,79 @@
+"""Prepare the technology cost table of one planning horizon.
+
+The unit corrections, default values and annuities are computed once
+per cost file by the rule prepare_costs and stored as a typed table
+indexed by technology, which prepare_sector_network,
+add_existing_baseyear and make_summary load with load_costs. The fixed
+costs are stored per year and scaled to the modelled years on loading.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def annuity(n, r):
+    """Calculate the annuity factor for assets with lifetimes n years and
+    discount rates r, vectorised over arrays or series of both; as
+    vresutils.costdata.annuity the factor is 1/n unless r > 0."""
+
+    n = np.asarray(n, dtype=float)
+    r = np.asarray(r, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r > 0, r/(1. - 1./(1.+r)**n), 1/n)
+
+
+def prepare_costs(cost_file, USD_to_EUR, discount_rate, lifetime):
+
+    #set all asset costs and other parameters
+    costs = pd.read_csv(cost_file,index_col=list(range(2))).sort_index()
+
+    #correct units to MW and EUR
+    costs.loc[costs.unit.str.contains("/kW"),"value"]*=1e3
+    costs.loc[costs.unit.str.contains("USD"),"value"]*=USD_to_EUR
+
+    #min_count=1 is important to generate NaNs which are then filled by fillna
+    costs = costs.loc[:, "value"].unstack(level=1).groupby("technology").sum(min_count=1)
+    costs = costs.fillna({"CO2 intensity" : 0,
+                          "FOM" : 0,
+                          "VOM" : 0,
+                          "discount rate" : discount_rate,
+                          "efficiency" : 1,
+                          "fuel" : 0,
+                          "investment" : 0,
+                          "lifetime" : lifetime
+    })
+
+    #fixed costs per year, scaled to the modelled years in load_costs
+    costs["fixed"] = (annuity(costs["lifetime"], costs["discount rate"]) + costs["FOM"]/100.)*costs["investment"]
+
+    return costs.astype(float)
+
+
+def load_costs(fn, Nyears=1.):
+    """Load the cost table prepared by the rule prepare_costs with the
+    fixed costs for Nyears years."""
+
+    costs = pd.read_hdf(fn, "costs")
+    costs["fixed"] *= Nyears
+    return costs
+
+
+if __name__ == "__main__":
+    # Detect running outside of snakemake and mock snakemake for testing
+    if 'snakemake' not in globals():
+        from vresutils.snakemake import MockSnakemake
+        snakemake = MockSnakemake(
+            wildcards=dict(planning_horizons='2030'),
+            input=dict(costs="../technology-data/outputs/costs_{planning_horizons}.csv"),
+            output=dict(costs="resources/costs_{planning_horizons}.h5")
+        )
+        import yaml
+        with open('config.yaml', encoding='utf8') as f:
+            snakemake.config = yaml.safe_load(f)
+
+    costs = prepare_costs(snakemake.input.costs,
+                          snakemake.config['costs']['USD2013_to_EUR2013'],
+                          snakemake.config['costs']['discountrate'],
+                          snakemake.config['costs']['lifetime'])
+
+    costs.to_hdf(snakemake.output.costs, "costs", mode="w", format="table")
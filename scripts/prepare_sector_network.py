@@ -7,7 +7,9 @@ idx = pd.IndexSlice
 
 import numpy as np
 import xarray as xr
-import re, os, sys
+import re, os, sys, io
+import inspect
+import heapq
 
 from six import iteritems, string_types
 
@@ -20,7 +22,10 @@ import pytz
 from vresutils.costdata import annuity
 
 from scipy.stats import beta
-from build_energy_totals import build_eea_co2, build_eurostat_co2, build_co2_totals
+from frame_cache import make_key, load_frames, store_frames
+from prepare_costs import load_costs
+from staged_network import StagedNetwork
+from network_io import export_network, load_network
 
 #First tell PyPSA that links can have multiple outputs by
 #overriding the component_attrs. This can be done for
@@ -48,20 +53,15 @@ override_component_attrs["Store"].loc["lifetime"] = ["float","years",np.nan,"lif
 
 
 
-def co2_emissions_year(cts, opts, year):
+def co2_emissions_year(emissions, cts, opts, year):
     """
-    Calculate CO2 emissions in one specific year (e.g. 1990 or 2018).
+    Calculate CO2 emissions in one specific year (e.g. 1990 or 2018)
+    from the emissions table built by rule build_co2_emissions.
     """
-    eea_co2 = build_eea_co2(year)
+    assert year in emissions.index.unique(level="year"), \
+        f"No CO2 emissions for {year}, add it to co2_emissions_years in config.yaml"
 
-    # TODO: read Eurostat data from year>2014, this only affects the estimation of
-    # CO2 emissions for "BA","RS","AL","ME","MK"
-    if year > 2014:
-        eurostat_co2 = build_eurostat_co2(year=2014)
-    else:
-        eurostat_co2 = build_eurostat_co2(year)
-
-    co2_totals = build_co2_totals(eea_co2, eurostat_co2)
+    co2_totals = emissions.loc[year]
 
     co2_emissions = co2_totals.loc[cts, "electricity"].sum()
 
@@ -78,7 +78,7 @@ def co2_emissions_year(cts, opts, year):
     return co2_emissions
 
 
-def build_carbon_budget(o):
+def build_carbon_budget(o, co2_emissions, scenario):
     #distribute carbon budget following beta or exponential transition path
     if "be" in o:
         #beta decay
@@ -94,10 +94,10 @@ def build_carbon_budget(o):
     pop_layout["ct"] = pop_layout.index.str[:2]
     cts = pop_layout.ct.value_counts().index
 
-    e_1990 = co2_emissions_year(cts, opts, year=1990)
+    e_1990 = co2_emissions_year(co2_emissions, cts, opts, year=1990)
 
     #emissions at the beginning of the path (last year available 2018)
-    e_0 = co2_emissions_year(cts, opts, year=2018)
+    e_0 = co2_emissions_year(co2_emissions, cts, opts, year=2018)
     #emissions in 2019 and 2020 assumed equal to 2018 and substracted
     carbon_budget -= 2*e_0
     planning_horizons = snakemake.config['scenario']['planning_horizons']
@@ -120,11 +120,21 @@ def build_carbon_budget(o):
         CO2_CAP[o] = [(e_0/e_1990)*(1+(m+r)*(t-t_0))*np.exp(-m*(t-t_0)) for t in planning_horizons]
 
 
-    CO2_CAP.to_csv(path_cb + 'carbon_budget_distribution.csv', sep=',',
-                   line_terminator='\n',  float_format='%.3f')
-    countries=pd.Series(data=cts)
-    countries.to_csv(path_cb + 'countries.csv', sep=',',
-               line_terminator='\n',  float_format='%.3f')
+    cap_csv = CO2_CAP.to_csv(sep=',', line_terminator='\n', float_format='%.3f')
+    countries_csv = pd.Series(data=cts).to_csv(sep=',', line_terminator='\n', float_format='%.3f')
+
+    # the files are only written for plot_summary, one per scenario; the
+    # jobs of its planning horizons write the same, so they are replaced
+    # atomically and never read back
+    for fn, csv in [('carbon_budget_distribution_{}.csv'.format(scenario), cap_csv),
+                    ('countries_{}.csv'.format(scenario), countries_csv)]:
+        tmp_fn = path_cb + '{}.{}.tmp'.format(fn, os.getpid())
+        with open(tmp_fn, 'w') as f:
+            f.write(csv)
+        os.replace(tmp_fn, path_cb + fn)
+
+    #the path as written, i.e. rounded to float_format
+    return pd.read_csv(io.StringIO(cap_csv), index_col=0)
 
 
 def add_lifetime_wind_solar(n):
@@ -507,36 +517,176 @@ def set_line_volume_limit(n, lv):
 
 
 
+def reduce_blocks(values, starts, how):
+    """Reduce the row blocks of values starting at positions starts with
+    how in ["mean", "sum", "min", "max"], skipping NaNs like pandas does."""
+
+    lengths = np.diff(np.append(starts, len(values)))
+    regular = (lengths == lengths[0]).all()
+
+    if how == "mean" and np.isnan(values).any():
+        valid = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (reduce_blocks(np.where(valid, values, 0.), starts, "sum")
+                    / reduce_blocks(valid.astype(float), starts, "sum"))
+
+    if regular:
+        # equal group lengths, e.g. for resampling, are reduced by reshaping
+        values = values.reshape(len(starts), lengths[0], -1)
+        if how == "min":
+            return np.fmin.reduce(values, axis=1)
+        elif how == "max":
+            return np.fmax.reduce(values, axis=1)
+        values = values.sum(axis=1)
+    else:
+        if how == "min":
+            return np.fmin.reduceat(values, starts)
+        elif how == "max":
+            return np.fmax.reduceat(values, starts)
+        values = np.add.reduceat(values, starts)
+
+    return values if how == "sum" else values / lengths[:,None]
+
+
+def aggregate_snapshots(n, snapshots, starts, max_block_size=2**24):
+    """Aggregate the snapshots and all time-varying data of network n in place.
+
+    snapshots are the new snapshots and starts the positions of the first
+    original snapshot represented by each of them. Time series are averaged,
+    except for the e_max_pu and e_min_pu of stores, which take the most
+    restrictive value. Series with the same reduction are stacked into
+    contiguous blocks of at most max_block_size values, each of which is
+    reduced at once by reduce_blocks and written back without copying the
+    network.
+    """
+
+    starts = np.asarray(starts)
+    snapshots = pd.Index(snapshots)
+
+    snapshot_weightings = pd.Series(np.add.reduceat(n.snapshot_weightings.values, starts),
+                                    index=snapshots, name=n.snapshot_weightings.name)
+
+    # the series with data are taken out of the network before setting the
+    # snapshots, so that set_snapshots only reindexes empty series
+    blocks = {"mean" : [], "min" : [], "max" : []}
+    for c in n.iterate_components():
+        for k, df in iteritems(c.pnl):
+            if df.empty:
+                continue
+            elif c.list_name == "stores" and k == "e_max_pu":
+                blocks["min"].append((c.pnl, k, df))
+            elif c.list_name == "stores" and k == "e_min_pu":
+                blocks["max"].append((c.pnl, k, df))
+            else:
+                blocks["mean"].append((c.pnl, k, df))
+            c.pnl[k] = df.iloc[:, :0]
+
+    n.set_snapshots(snapshots)
+    n.snapshot_weightings = snapshot_weightings
+
+    for how, series in iteritems(blocks):
+        while series:
+            chunk = [series.pop(0)]
+            size = chunk[0][2].size
+            while series and size + series[0][2].size <= max_block_size:
+                size += series[0][2].size
+                chunk.append(series.pop(0))
+
+            columns = [df.columns for pnl, k, df in chunk]
+            if len(chunk) == 1:
+                values = chunk[0][2].values.astype(float, copy=False)
+            else:
+                values = np.hstack([df.values for pnl, k, df in chunk]).astype(float, copy=False)
+
+            values = reduce_blocks(values, starts, how)
+
+            offsets = np.cumsum([0] + [len(cols) for cols in columns])
+            for (pnl, k, df), cols, i in zip(chunk, columns, offsets):
+                pnl[k] = pd.DataFrame(values[:, i:i+len(cols)], index=snapshots, columns=cols)
+
+    return n
+
+
 def average_every_nhours(n, offset):
     logger.info('Resampling the network to {}'.format(offset))
-    m = n.copy(with_time=False)
-
-    #fix copying of network attributes
-    #copied from pypsa/io.py, should be in pypsa/components.py#Network.copy()
-    allowed_types = (float,int,bool) + string_types + tuple(np.typeDict.values())
-    attrs = dict((attr, getattr(n, attr))
-                 for attr in dir(n)
-                 if (not attr.startswith("__") and
-                     isinstance(getattr(n,attr), allowed_types)))
-    for k,v in iteritems(attrs):
-        setattr(m,k,v)
-
-    snapshot_weightings = n.snapshot_weightings.resample(offset).sum()
-    m.set_snapshots(snapshot_weightings.index)
-    m.snapshot_weightings = snapshot_weightings
 
+    first = (pd.Series(np.arange(len(n.snapshots)), index=n.snapshots)
+             .resample(offset).first().dropna())
+
+    return aggregate_snapshots(n, first.index, first.values.astype(int))
+
+
+def segment_snapshots(n, segments):
+    """Aggregate the snapshots of network n to the given number of segments of
+    consecutive snapshots with variable length, by hierarchically merging the
+    pair of neighbouring segments whose time-varying data is most similar
+    (Ward's criterion). Unlike fixed n-hour averaging, this keeps short
+    extreme periods like demand peaks and renewable droughts."""
+
+    logger.info('Segmenting the network to {} snapshots'.format(segments))
+
+    #normalised time-varying data as features, averaged by carrier and country
+    #to keep the feature matrix small for high spatial resolutions
+    features = []
     for c in n.iterate_components():
-        pnl = getattr(m, c.list_name+"_t")
         for k, df in iteritems(c.pnl):
-            if not df.empty:
-                if c.list_name == "stores" and k == "e_max_pu":
-                    pnl[k] = df.resample(offset).min()
-                elif c.list_name == "stores" and k == "e_min_pu":
-                    pnl[k] = df.resample(offset).max()
-                else:
-                    pnl[k] = df.resample(offset).mean()
+            if df.empty:
+                continue
+            spread = df.max() - df.min()
+            df = df.loc[:, spread > 0]
+            if df.empty:
+                continue
+            df = (df - df.min())/spread[df.columns]
+            if "carrier" in c.df:
+                carrier = c.df.carrier.reindex(df.columns).fillna("").values
+            else:
+                carrier = np.repeat("", len(df.columns))
+            features.append(df.groupby([carrier, df.columns.str[:2]], axis=1).mean().values)
+
+    weightings = n.snapshot_weightings.values.astype(float)
+    T = len(weightings)
+
+    if not features or segments >= T:
+        logger.info("Nothing to segment")
+        return n
+
+    X = np.hstack(features)
+
+    def merge_cost(i, j):
+        return weightings[i]*weightings[j]/(weightings[i] + weightings[j])*((X[i] - X[j])**2).sum()
+
+    #segments are identified by their first snapshot, X and weightings are
+    #updated in place for the first snapshot of each segment
+    alive = np.ones(T, dtype=bool)
+    version = np.zeros(T, dtype=int)
+    following = np.arange(1, T+1)
+    preceding = np.arange(-1, T-1)
+
+    heap = [(merge_cost(i, i+1), i, i+1, 0, 0) for i in range(T-1)]
+    heapq.heapify(heap)
+
+    n_segments = T
+    while n_segments > segments:
+        _, i, j, version_i, version_j = heapq.heappop(heap)
+        if not (alive[i] and alive[j]) or version[i] != version_i or version[j] != version_j:
+            continue
 
-    return m
+        X[i] = (weightings[i]*X[i] + weightings[j]*X[j])/(weightings[i] + weightings[j])
+        weightings[i] += weightings[j]
+        alive[j] = False
+        version[i] += 1
+        n_segments -= 1
+
+        following[i] = following[j]
+        if following[i] < T:
+            preceding[following[i]] = i
+            heapq.heappush(heap, (merge_cost(i, following[i]), i, following[i], version[i], version[following[i]]))
+        if preceding[i] >= 0:
+            heapq.heappush(heap, (merge_cost(preceding[i], i), preceding[i], i, version[preceding[i]], version[i]))
+
+    starts = np.flatnonzero(alive)
+
+    return aggregate_snapshots(n, n.snapshots[starts], starts)
 
 
 def generate_periodic_profiles(dt_index=pd.date_range("2011-01-01 00:00","2011-12-31 23:00",freq="H",tz="UTC"),
@@ -546,16 +696,26 @@ def generate_periodic_profiles(dt_index=pd.date_range("2011-01-01 00:00","2011-1
        each country for the period dt_index, taking account of time
        zones and Summer Time.
 
+       The hour-of-week index is only computed once per distinct time
+       zone and then gathered for all nodes sharing that time zone.
     """
 
+    weekly_profile = np.asarray(weekly_profile)
+    assert len(weekly_profile) == 24*7, "weekly_profile must have 24*7 entries"
 
-    weekly_profile = pd.Series(weekly_profile,range(24*7))
+    nodes = pd.Index(nodes)
 
-    week_df = pd.DataFrame(index=dt_index,columns=nodes)
+    timezones = timezone_mappings.loc[nodes.str[:2]].values
+    tz_codes, tz_names = pd.factorize(timezones)
 
-    for ct in nodes:
-        week_df[ct] = [24*dt.weekday()+dt.hour for dt in dt_index.tz_convert(pytz.timezone(timezone_mappings[ct[:2]]))]
-        week_df[ct] = week_df[ct].map(weekly_profile)
+    hour_of_week = np.empty((len(dt_index), len(tz_names)), dtype=int)
+    for i, tz in enumerate(tz_names):
+        local_index = dt_index.tz_convert(pytz.timezone(tz))
+        hour_of_week[:,i] = 24*local_index.weekday + local_index.hour
+
+    week_df = pd.DataFrame(weekly_profile[hour_of_week[:,tz_codes]],
+                           index=dt_index,
+                           columns=nodes)
 
     return week_df
 
@@ -592,7 +752,9 @@ def transport_degree_factor(temperature,deadband_lower=15,deadband_upper=20,
     return dd
 
 
-def prepare_data(network):
+def build_data(network):
+    """Read in and derive the demand and profile data, which only depends on the
+    clustering and a few sector settings, but not on the network itself."""
 
 
     ##############
@@ -638,11 +800,7 @@ def prepare_data(network):
             electric_heat_supply["{} {}".format(sector,use)] = (heat_demand_shape/heat_demand_shape.sum()).multiply(nodal_energy_totals["electricity {} {}".format(sector,use)])*1e6
 
     heat_demand = pd.concat(heat_demand,axis=1)
-    electric_heat_supply = pd.concat(electric_heat_supply,axis=1)
-
-    #subtract from electricity load since heat demand already in heat_demand
-    electric_nodes = n.loads.index[n.loads.carrier == "electricity"]
-    n.loads_t.p_set[electric_nodes] = n.loads_t.p_set[electric_nodes] - electric_heat_supply.groupby(level=1,axis=1).sum()[electric_nodes]
+    electric_heat_supply = pd.concat(electric_heat_supply,axis=1).groupby(level=1,axis=1).sum()
 
     ##############
     #Transport
@@ -739,34 +897,78 @@ def prepare_data(network):
     co2_totals = 1e6*pd.read_csv(snakemake.input.co2_totals_name,index_col=0)
 
 
+    return dict(nodal_energy_totals=nodal_energy_totals,
+                heat_demand=heat_demand,
+                ashp_cop=ashp_cop,
+                gshp_cop=gshp_cop,
+                solar_thermal=solar_thermal,
+                transport=transport,
+                avail_profile=avail_profile,
+                dsm_profile=dsm_profile,
+                co2_totals=co2_totals,
+                nodal_transport_data=nodal_transport_data,
+                electric_heat_supply=electric_heat_supply)
+
+
+def prepare_data_cache_key(network):
+    """Hash of all inputs, settings and code which build_data depends on."""
+
+    files = [snakemake.input[k] for k in ["cop_air_total", "cop_soil_total",
+                                          "solar_thermal_total", "energy_totals_name",
+                                          "heat_demand_total", "heat_profile",
+                                          "transport_name", "temp_air_total",
+                                          "co2_totals_name", "timezone_mappings",
+                                          "clustered_pop_layout"]]
+    files += [os.path.join(snakemake.input.traffic_data, fn)
+              for fn in ["KFZ__count", "Pkw__count"]]
+
+    settings = {k: options[k] for k in ['solar_cf_correction',
+                                        'transport_heating_deadband_lower',
+                                        'transport_heating_deadband_upper',
+                                        'ICE_lower_degree_factor',
+                                        'ICE_upper_degree_factor',
+                                        'EV_lower_degree_factor',
+                                        'EV_upper_degree_factor',
+                                        'bev_dsm_restriction_time',
+                                        'bev_dsm_restriction_value']}
+    settings["land_transport_demand"] = get_parameter(options["land_transport_demand"])
+    settings["Nyears"] = float(Nyears)
+    settings["snapshots"] = list(network.snapshots.astype(str))
+    settings["code"] = "".join(inspect.getsource(f) for f in [build_data,
+                                                              generate_periodic_profiles,
+                                                              transport_degree_factor,
+                                                              get_parameter])
+
+    return make_key(files, settings)
 
-    return nodal_energy_totals, heat_demand, ashp_cop, gshp_cop, solar_thermal, transport, avail_profile, dsm_profile, co2_totals, nodal_transport_data
 
+def prepare_data(network):
 
+    cache_config = snakemake.config["prepare_data_cache"]
 
-def prepare_costs(cost_file, USD_to_EUR, discount_rate, Nyears, lifetime):
+    data = None
+    if cache_config["enable"]:
+        key = prepare_data_cache_key(network)
+        data = load_frames(cache_config["directory"], key)
+        if data is not None:
+            logger.info(f"Loaded prepared data from cache entry {key}")
 
-    #set all asset costs and other parameters
-    costs = pd.read_csv(cost_file,index_col=list(range(2))).sort_index()
+    if data is None:
+        data = build_data(network)
+        if cache_config["enable"]:
+            store_frames(cache_config["directory"], key, data,
+                         cache_config["max_size_mb"])
 
-    #correct units to MW and EUR
-    costs.loc[costs.unit.str.contains("/kW"),"value"]*=1e3
-    costs.loc[costs.unit.str.contains("USD"),"value"]*=USD_to_EUR
+    #subtract from electricity load since heat demand already in heat_demand
+    electric_nodes = network.loads.index[network.loads.carrier == "electricity"]
+    network.loads_t.p_set[electric_nodes] = network.loads_t.p_set[electric_nodes] - data["electric_heat_supply"][electric_nodes]
+
+    return (data["nodal_energy_totals"], data["heat_demand"], data["ashp_cop"],
+            data["gshp_cop"], data["solar_thermal"], data["transport"],
+            data["avail_profile"], data["dsm_profile"], data["co2_totals"],
+            data["nodal_transport_data"])
 
-    #min_count=1 is important to generate NaNs which are then filled by fillna
-    costs = costs.loc[:, "value"].unstack(level=1).groupby("technology").sum(min_count=1)
-    costs = costs.fillna({"CO2 intensity" : 0,
-                          "FOM" : 0,
-                          "VOM" : 0,
-                          "discount rate" : discount_rate,
-                          "efficiency" : 1,
-                          "fuel" : 0,
-                          "investment" : 0,
-                          "lifetime" : lifetime
-    })
 
-    costs["fixed"] = [(annuity(v["lifetime"],v["discount rate"])+v["FOM"]/100.)*v["investment"]*Nyears for i,v in costs.iterrows()]
-    return costs
 
 def add_generation(network):
     print("adding electricity generation")
@@ -2465,12 +2667,13 @@ if __name__ == "__main__":
             input=dict( network='../pypsa-eur/networks/elec_s{simpl}_{clusters}_ec_lv{lv}_{opts}.nc',
                         energy_totals_name='resources/energy_totals.csv',
                         co2_totals_name='resources/co2_totals.csv',
+                        co2_emissions='resources/co2_emissions.csv',
                         transport_name='resources/transport_data.csv',
                 	    traffic_data = "data/emobility/",
                         biomass_potentials='resources/biomass_potentials.csv',
                         timezone_mappings='data/timezone_mappings.csv',
                         heat_profile="data/heat_load_profile_BDEW.csv",
-                        costs="../technology-data/outputs/costs_{planning_horizons}.csv",
+                        costs="resources/costs_{planning_horizons}.h5",
                 	    h2_cavern = "data/hydrogen_salt_cavern_potentials.csv",
                         profile_offwind_ac="../pypsa-eur/resources/profile_offwind-ac.nc",
                         profile_offwind_dc="../pypsa-eur/resources/profile_offwind-dc.nc",
@@ -2509,8 +2712,6 @@ if __name__ == "__main__":
 
     logging.basicConfig(level=snakemake.config['logging_level'])
 
-    timezone_mappings = pd.read_csv(snakemake.input.timezone_mappings,index_col=0,squeeze=True,header=None)
-
     options = snakemake.config["sector"]
 
     opts = snakemake.wildcards.sector_opts.split('-')
@@ -2519,171 +2720,192 @@ if __name__ == "__main__":
 
     investment_year=int(snakemake.wildcards.planning_horizons[-4:])
 
-    n = pypsa.Network(snakemake.input.network,
-                      override_component_attrs=override_component_attrs)
-
-    Nyears = n.snapshot_weightings.sum()/8760.
-
     pop_layout = pd.read_csv(snakemake.input.clustered_pop_layout,index_col=0)
     pop_layout["ct"] = pop_layout.index.str[:2]
     ct_total = pop_layout.total.groupby(pop_layout["ct"]).sum()
     pop_layout["ct_total"] = pop_layout["ct"].map(ct_total.get)
     pop_layout["fraction"] = pop_layout["total"]/pop_layout["ct_total"]
 
-    simplified_pop_layout = pd.read_csv(snakemake.input.simplified_pop_layout,index_col=0)
+    # The sector-coupled base network is built once by the rule
+    # prepare_base_network for all sector_opts which only differ in
+    # resampling, CO2 limits, line extension limits and carrier factors.
+    # These are then applied as overlays by the rule prepare_sector_network.
+    if "base_network" not in snakemake.input.keys():
 
-    costs = prepare_costs(snakemake.input.costs,
-                          snakemake.config['costs']['USD2013_to_EUR2013'],
-                          snakemake.config['costs']['discountrate'],
-                          Nyears,
-                          snakemake.config['costs']['lifetime'])
+        timezone_mappings = pd.read_csv(snakemake.input.timezone_mappings,index_col=0,squeeze=True,header=None)
 
-    remove_elec_base_techs(n)
+        n = pypsa.Network(snakemake.input.network,
+                          override_component_attrs=override_component_attrs)
 
-    n.loads["carrier"] = "electricity"
+        Nyears = n.snapshot_weightings.sum()/8760.
 
-    remove_non_electric_buses(n)
+        simplified_pop_layout = pd.read_csv(snakemake.input.simplified_pop_layout,index_col=0)
 
-    n.buses["location"] = n.buses.index
+        costs = load_costs(snakemake.input.costs, Nyears)
 
-    update_wind_solar_costs(n, costs)
+        remove_elec_base_techs(n)
 
-    if snakemake.config["foresight"]=='myopic':
-        add_lifetime_wind_solar(n)
-        add_carrier_buses(n,snakemake.config['existing_capacities']['conventional_carriers'])
+        n.loads["carrier"] = "electricity"
 
-    add_co2_tracking(n)
+        remove_non_electric_buses(n)
 
-    add_generation(n)
+        n.buses["location"] = n.buses.index
 
-    add_storage(n)
+        update_wind_solar_costs(n, costs)
 
-    for o in opts:
-        if o[:4] == "wave":
-            wave_cost_factor = float(o[4:].replace("p",".").replace("m","-"))
-            print("Including wave generators with cost factor of", wave_cost_factor)
-            add_wave(n, wave_cost_factor)
-        if o[:4] == "dist":
-            snakemake.config["sector"]['electricity_distribution_grid'] = True
-            snakemake.config["sector"]['electricity_distribution_grid_cost_factor'] = float(o[4:].replace("p",".").replace("m","-"))
-        # if o == "bioT":
-        #     options["biomass_transport"] = True
+        # components added from here on are imported in bulk
+        n = StagedNetwork(n)
 
-    nodal_energy_totals, heat_demand, ashp_cop, gshp_cop, solar_thermal, transport, avail_profile, dsm_profile, co2_totals, nodal_transport_data = prepare_data(n)
+        if snakemake.config["foresight"]=='myopic':
+            add_lifetime_wind_solar(n)
+            add_carrier_buses(n,snakemake.config['existing_capacities']['conventional_carriers'])
 
-    if "nodistrict" in opts:
-        options["central"] = False
+        add_co2_tracking(n)
 
-    if "H" in opts:
-        add_heat(n)
+        add_generation(n)
 
-    if "I" in opts:
-        add_industry(n)
+        add_storage(n)
 
-    if options["hvdc"]:
-        hvdc_transport_model(n)
+        for o in opts:
+            if o[:4] == "wave":
+                wave_cost_factor = float(o[4:].replace("p",".").replace("m","-"))
+                print("Including wave generators with cost factor of", wave_cost_factor)
+                add_wave(n, wave_cost_factor)
+            if o[:4] == "dist":
+                snakemake.config["sector"]['electricity_distribution_grid'] = True
+                snakemake.config["sector"]['electricity_distribution_grid_cost_factor'] = float(o[4:].replace("p",".").replace("m","-"))
+            # if o == "bioT":
+            #     options["biomass_transport"] = True
 
-    for o in opts:
-        if "B" in o:
-            add_biomass(n)
-            if options["bioT"]:
-                add_biomass_transport(n)
+        nodal_energy_totals, heat_demand, ashp_cop, gshp_cop, solar_thermal, transport, avail_profile, dsm_profile, co2_totals, nodal_transport_data = prepare_data(n)
 
-    if "T" in opts:
-        add_land_transport(n)
+        if "nodistrict" in opts:
+            options["central"] = False
 
-    if "I" in opts and "H" in opts:
-        add_waste_heat(n)
+        if "H" in opts:
+            add_heat(n)
 
-    if options['dac']:
-        add_dac(n)
+        if "I" in opts:
+            add_industry(n)
 
-    if "decentral" in opts:
-        decentral(n)
+        if options["hvdc"]:
+            hvdc_transport_model(n)
 
-    if "noH2network" in opts:
-        remove_h2_network(n)
+        for o in opts:
+            if "B" in o:
+                add_biomass(n)
+                if options["bioT"]:
+                    add_biomass_transport(n)
+
+        if "T" in opts:
+            add_land_transport(n)
+
+        if "I" in opts and "H" in opts:
+            add_waste_heat(n)
+
+        if options['dac']:
+            add_dac(n)
+
+        if "decentral" in opts:
+            decentral(n)
+
+        if "noH2network" in opts:
+            remove_h2_network(n)
+
+        if snakemake.config["sector"]['electricity_distribution_grid']:
+            insert_electricity_distribution_grid(n)
+
+        export_network(n, snakemake.output[0], snakemake.config['network_io'])
 
-    for o in opts:
-        m = re.match(r'^\d+h$', o, re.IGNORECASE)
-        if m is not None:
-            n = average_every_nhours(n, m.group(0))
-            break
     else:
-        logger.info("No resampling")
 
-    #process CO2 limit
-    limit = get_parameter(snakemake.config["co2_budget"])
-    print("CO2 limit set to",limit)
+        n = load_network(snakemake.input.base_network,
+                         override_component_attrs=override_component_attrs)
 
-    for o in opts:
+        Nyears = n.snapshot_weightings.sum()/8760.
 
-        if "cb" in o:
-            path_cb = snakemake.config['results_dir'] + snakemake.config['run'] + '/csvs/'
-            if not os.path.exists(path_cb):
-                os.makedirs(path_cb)
-            try:
-                CO2_CAP=pd.read_csv(path_cb + 'carbon_budget_distribution.csv', index_col=0)
-            except:
-                build_carbon_budget(o)
-                CO2_CAP=pd.read_csv(path_cb + 'carbon_budget_distribution.csv', index_col=0)
+        costs = load_costs(snakemake.input.costs, Nyears)
 
-            limit=CO2_CAP.loc[investment_year]
-            print("overriding CO2 limit with scenario limit",limit)
+        #1e6 to convert Mt to tCO2
+        co2_totals = 1e6*pd.read_csv(snakemake.input.co2_totals_name,index_col=0)
 
-    for o in opts:
-        if "Co2L" in o:
-            limit = o[o.find("Co2L") + 4:]
-            limit = float(limit.replace("p", ".").replace("m", "-"))
-            print("overriding CO2 limit with scenario limit", limit)
+        for o in opts:
+            m = re.match(r'^\d+h$', o, re.IGNORECASE)
+            if m is not None:
+                n = average_every_nhours(n, m.group(0))
+                break
+            m = re.match(r'^seg(\d+)$', o)
+            if m is not None:
+                n = segment_snapshots(n, int(m.group(1)))
+                break
+        else:
+            logger.info("No resampling")
 
+        #process CO2 limit
+        limit = get_parameter(snakemake.config["co2_budget"])
+        print("CO2 limit set to",limit)
 
-    print("adding CO2 budget limit as per unit of 1990 levels of",limit)
-    add_co2limit(n, Nyears, limit)
+        for o in opts:
 
-    for o in opts:
+            if "cb" in o:
+                path_cb = snakemake.config['results_dir'] + snakemake.config['run'] + '/csvs/'
+                if not os.path.exists(path_cb):
+                    os.makedirs(path_cb)
+                co2_emissions = pd.read_csv(snakemake.input.co2_emissions, index_col=[0,1])
+                scenario = "elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}".format(**dict(snakemake.wildcards.items()))
+                CO2_CAP = build_carbon_budget(o, co2_emissions, scenario)
+
+                limit=CO2_CAP.loc[investment_year]
+                print("overriding CO2 limit with scenario limit",limit)
+
+        for o in opts:
+            if "Co2L" in o:
+                limit = o[o.find("Co2L") + 4:]
+                limit = float(limit.replace("p", ".").replace("m", "-"))
+                print("overriding CO2 limit with scenario limit", limit)
 
-        if o[:10] == 'linemaxext':
-            maxext = float(o[10:])*1e3
-            print("limiting new HVAC and HVDC extensions to",maxext,"MW")
-            n.lines['s_nom_max'] = n.lines['s_nom'] + maxext
-            hvdc = n.links.index[n.links.carrier == 'DC']
-            n.links.loc[hvdc,'p_nom_max'] = n.links.loc[hvdc,'p_nom'] + maxext
 
+        print("adding CO2 budget limit as per unit of 1990 levels of",limit)
+        add_co2limit(n, Nyears, limit)
 
-    if snakemake.config["sector"]['electricity_distribution_grid']:
-        insert_electricity_distribution_grid(n)
+        for o in opts:
 
+            if o[:10] == 'linemaxext':
+                maxext = float(o[10:])*1e3
+                print("limiting new HVAC and HVDC extensions to",maxext,"MW")
+                n.lines['s_nom_max'] = n.lines['s_nom'] + maxext
+                hvdc = n.links.index[n.links.carrier == 'DC']
+                n.links.loc[hvdc,'p_nom_max'] = n.links.loc[hvdc,'p_nom'] + maxext
 
 
-    for o in opts:
-        if "+" in o:
-            oo = o.split("+")
-            carrier_list=np.hstack((n.generators.carrier.unique(), n.links.carrier.unique(),
-                                    n.stores.carrier.unique(), n.storage_units.carrier.unique()))
-            suptechs = map(lambda c: c.split("-", 2)[0], carrier_list)
-            if oo[0].startswith(tuple(suptechs)):
-                carrier = oo[0]
-                attr_lookup = {"p": "p_nom_max", "c": "capital_cost"}
-                attr = attr_lookup[oo[1][0]]
-                factor = float(oo[1][1:])
-                #beware if factor is 0 and p_nom_max is np.inf, 0*np.inf is nan
-                if carrier == "AC":  # lines do not have carrier
-                    n.lines[attr] *= factor
-                else:
-                    comps = {"Generator", "Link", "StorageUnit"} if attr=='p_nom_max' else {"Generator", "Link", "StorageUnit", "Store"}
-                    for c in n.iterate_components(comps):
-                        if carrier=='solar':
-                            sel = c.df.carrier.str.contains(carrier) & ~c.df.carrier.str.contains("solar rooftop")
-                        else:
-                            sel = c.df.carrier.str.contains(carrier)
-                        c.df.loc[sel,attr] *= factor
-                print("changing", attr ,"for",carrier,"by factor",factor)
-
-
-    if snakemake.config["sector"]['gas_distribution_grid']:
-        insert_gas_distribution_costs(n)
-    if snakemake.config["sector"]['electricity_grid_connection']:
-        add_electricity_grid_connection(n)
-
-    n.export_to_netcdf(snakemake.output[0])
+        for o in opts:
+            if "+" in o:
+                oo = o.split("+")
+                carrier_list=np.hstack((n.generators.carrier.unique(), n.links.carrier.unique(),
+                                        n.stores.carrier.unique(), n.storage_units.carrier.unique()))
+                suptechs = map(lambda c: c.split("-", 2)[0], carrier_list)
+                if oo[0].startswith(tuple(suptechs)):
+                    carrier = oo[0]
+                    attr_lookup = {"p": "p_nom_max", "c": "capital_cost"}
+                    attr = attr_lookup[oo[1][0]]
+                    factor = float(oo[1][1:])
+                    #beware if factor is 0 and p_nom_max is np.inf, 0*np.inf is nan
+                    if carrier == "AC":  # lines do not have carrier
+                        n.lines[attr] *= factor
+                    else:
+                        comps = {"Generator", "Link", "StorageUnit"} if attr=='p_nom_max' else {"Generator", "Link", "StorageUnit", "Store"}
+                        for c in n.iterate_components(comps):
+                            if carrier=='solar':
+                                sel = c.df.carrier.str.contains(carrier) & ~c.df.carrier.str.contains("solar rooftop")
+                            else:
+                                sel = c.df.carrier.str.contains(carrier)
+                            c.df.loc[sel,attr] *= factor
+                    print("changing", attr ,"for",carrier,"by factor",factor)
+
+
+        if snakemake.config["sector"]['gas_distribution_grid']:
+            insert_gas_distribution_costs(n)
+        if snakemake.config["sector"]['electricity_grid_connection']:
+            add_electricity_grid_connection(n)
+
+        export_network(n, snakemake.output[0], snakemake.config['network_io'])
@@ -0,0 +1,225 @@
+"""Estimate the memory and runtime of the network rules from the
+benchmarks of previous runs.
+
+The peak memory and runtime of preparing and solving a network grow
+with the number of clusters and snapshots and with the sectors in
+sector_opts. For each rule, a log-linear model of both in these
+features is fitted to the snakemake benchmarks of all runs in
+results_dir, with the peak of the memory logs of the solving rules.
+The snapshots of each run are taken from the config it saved with
+copy_config, benchmarks of other runs without one are left out. The
+model is refitted whenever benchmarks or saved configs were added or
+changed. Its predictions are scaled to cover the largest underestimate of the
+benchmarks it was fitted to and the configured margin. Rules with fewer
+than min_samples benchmarks, and jobs whose combination of features is
+not spanned by the benchmarks, keep their static resources.
+"""
+
+import os
+import re
+import glob
+import math
+
+import numpy as np
+import pandas as pd
+import yaml
+
+
+# benchmark directory of each rule; the myopic chain is benchmarked
+# with the suffix "myopic" instead of the planning horizon
+benchmark_dirs = {"prepare_base_network" : "prepare_base_network",
+                  "prepare_sector_network" : "prepare_network",
+                  "add_existing_baseyear" : "add_existing_baseyear",
+                  "add_brownfield" : "add_brownfield",
+                  "solve_network" : "solve_network",
+                  "solve_network_myopic" : "solve_network",
+                  "solve_network_myopic_chain" : "solve_network"}
+
+name_pattern = re.compile(r"^elec_s(?P<simpl>[a-zA-Z0-9]*)_(?P<clusters>[0-9]+m?)_lv(?P<lv>[a-z0-9\.]+)"
+                          r"_(?P<opts>[-+a-zA-Z0-9]*)_(?P<sector_opts>[-+a-zA-Z0-9\.\s]*)"
+                          r"_(?P<planning_horizons>[0-9]{4}|myopic)$")
+
+
+def features(wildcards, hours):
+    """Intercept, log of clusters and snapshots, and indicators of the
+    sectors of the wildcards, parsed as in prepare_sector_network."""
+
+    opts = wildcards["sector_opts"].split("-")
+
+    snapshots = hours
+    for o in opts:
+        m = re.match(r'^(\d+)h$', o, re.IGNORECASE)
+        if m is not None:
+            snapshots = hours/int(m.group(1))
+            break
+        m = re.match(r'^seg(\d+)$', o)
+        if m is not None:
+            snapshots = int(m.group(1))
+            break
+
+    return [1.,
+            math.log(int(wildcards["clusters"].rstrip("m"))),
+            math.log(snapshots),
+            float("T" in opts),
+            float("H" in opts),
+            float("I" in opts),
+            float(any("B" in o for o in opts))]
+
+
+def snapshot_hours(snapshots):
+    """Return the hours spanned by the snapshots config."""
+
+    return (pd.Timestamp(snapshots['end']) - pd.Timestamp(snapshots['start']))/pd.Timedelta(hours=1)
+
+
+def run_name(fn):
+    """Return the run of the benchmark fn."""
+
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(fn))))
+
+
+def read_benchmark(fn):
+    """Return the peak memory in MB and the runtime in seconds of a
+    snakemake benchmark, with the peak of its memory log if there is
+    one."""
+
+    df = pd.read_csv(fn, sep="\t", na_values="-")
+    mem_mb = df["max_rss"].max()
+
+    # the logs of a run are next to its benchmarks directory
+    run_dir = os.path.dirname(os.path.dirname(os.path.dirname(fn)))
+    log = os.path.join(run_dir, "logs", os.path.basename(fn) + "_memory.log")
+    if os.path.isfile(log):
+        mem = pd.read_csv(log, sep=" ", header=None, usecols=[1]).iloc[:, 0]
+        mem_mb = np.nanmax([mem_mb, mem.max()])
+
+    return mem_mb, df["s"].median()
+
+
+class ResourceEstimator(object):
+
+    def __init__(self, config):
+        self.config = config['resource_estimator']
+        self.results_dir = config['results_dir']
+        self.summary_dir = config['summary_dir']
+        self.run = config['run']
+        self.hours = snapshot_hours(config['snapshots'])
+        self._fits = {}
+
+    def benchmarks(self, rule):
+        """Return the benchmark files of rule in all runs in results_dir."""
+
+        return sorted(glob.glob(os.path.join(self.results_dir, "*", "benchmarks",
+                                             benchmark_dirs[rule], "elec_s*")))
+
+    def run_config(self, run):
+        """Return the config file saved by copy_config for run."""
+
+        return os.path.join(self.summary_dir, run, "configs", "config.yaml")
+
+    def run_hours(self, run):
+        """Return the hours spanned by the snapshots of run, from its
+        saved config, or None if it saved none. The current run has the
+        snapshots of the current config."""
+
+        if run == self.run:
+            return self.hours
+
+        fn = self.run_config(run)
+        if not os.path.isfile(fn):
+            return None
+        with open(fn) as f:
+            return snapshot_hours(yaml.safe_load(f)['snapshots'])
+
+    def samples(self, rule):
+        """Return the wildcards, snapshot hours, peak memory in MB and
+        runtime in seconds of the benchmarks of rule."""
+
+        samples = []
+        for fn in self.benchmarks(rule):
+            m = name_pattern.match(os.path.basename(fn))
+            if m is None or (m.group("planning_horizons") == "myopic") != (rule == "solve_network_myopic_chain"):
+                continue
+            hours = self.run_hours(run_name(fn))
+            if hours is None:
+                continue
+            mem_mb, runtime = read_benchmark(fn)
+            samples.append(dict(m.groupdict(), hours=hours, mem_mb=mem_mb, runtime=runtime))
+
+        return pd.DataFrame(samples, columns=list(name_pattern.groupindex) + ["hours", "mem_mb", "runtime"]).dropna()
+
+    def fit(self, rule):
+        """Return the coefficients and scale of the models of the peak
+        memory and runtime of rule by their logarithm, with the projection
+        on the features spanned by the benchmarks, or None if there are
+        fewer than min_samples benchmarks. The fit is cached until the
+        benchmarks or the saved configs of their runs change."""
+
+        files = self.benchmarks(rule)
+        files += [self.run_config(run) for run in sorted({run_name(fn) for fn in files})]
+        signature = tuple((fn, os.stat(fn).st_mtime_ns) for fn in files if os.path.isfile(fn))
+        if rule in self._fits and self._fits[rule][0] == signature:
+            return self._fits[rule][1]
+
+        samples = self.samples(rule)
+        fit = None
+        if len(samples) >= self.config['min_samples']:
+            X = np.array([features(w, w["hours"]) for _, w in samples.iterrows()])
+            fit = {"projection" : np.linalg.pinv(X).dot(X)}
+            for target in ["mem_mb", "runtime"]:
+                y = np.log(samples[target].values.astype(float).clip(min=1.))
+                coef = np.linalg.lstsq(X, y, rcond=None)[0]
+                # cover the largest underestimate of the benchmarks
+                scale = math.exp(max((y - X.dot(coef)).max(), 0.))
+                fit[target] = (coef, scale*self.config['margin'])
+
+        self._fits[rule] = (signature, fit)
+        return fit
+
+    def predict(self, rule, target, wildcards):
+        fit = self.fit(rule)
+        if fit is None:
+            return None
+
+        # combinations of features not spanned by the benchmarks, e.g. a
+        # sector which was only run with another one, are not estimable
+        x = np.array(features(wildcards, self.hours))
+        if not np.allclose(fit["projection"].dot(x), x):
+            return None
+
+        coef, scale = fit[target]
+        return math.exp(x.dot(coef))*scale
+
+    def mem_mb(self, rule, default):
+        """Return the mem_mb resource of rule, predicted from the
+        benchmarks if there are enough of them, or default otherwise.
+        Each restart of a job reserves the memory once more."""
+
+        if not self.config['enable']:
+            return default
+
+        def estimate(wildcards, attempt):
+            mem_mb = self.predict(rule, "mem_mb", wildcards)
+            if mem_mb is None:
+                mem_mb = default
+            else:
+                mem_mb = min(max(mem_mb, self.config['min_mem_mb']), self.config['max_mem_mb'])
+            return int(math.ceil(mem_mb*attempt))
+
+        return estimate
+
+    def runtime(self, rule):
+        """Return the runtime resource of rule in minutes, predicted from
+        the benchmarks if there are enough of them, or default_runtime
+        otherwise."""
+
+        if not self.config['enable']:
+            return self.config['default_runtime']
+
+        def estimate(wildcards, attempt):
+            runtime = self.predict(rule, "runtime", wildcards)
+            if runtime is None:
+                return self.config['default_runtime']
+            return int(math.ceil(runtime/60.*attempt))
+
+        return estimate
@@ -5,6 +5,12 @@ import logging
 logger = logging.getLogger(__name__)
 import gc
 import os
+import atexit
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import partial
 
 import pypsa
 
@@ -12,6 +18,9 @@ from pypsa.linopt import get_var, linexpr, define_constraints
 
 from pypsa.descriptors import free_output_series_dataframes
 
+from component_index import get_component_index, contains
+from network_io import export_network, load_network
+
 # Suppress logging of the slack bus choices
 pypsa.pf.logger.setLevel(logging.WARNING)
 
@@ -46,9 +55,65 @@ def patch_pyomo_tmpdir(tmpdir):
     from pyutilib.services import TempfileManager
     TempfileManager.tempdir = tmpdir
 
-def prepare_network(n, solve_opts=None):
+def format_solver_options(solver_name, solver_options):
+    # cbc and glpk are called on the command line by pypsa, which appends
+    # the options as a string; flags without value are given as null
+    if solver_name not in ('cbc', 'glpk') or not solver_options:
+        return solver_options
+
+    args = []
+    for k, v in solver_options.items():
+        args.append(('-' if solver_name == 'cbc' else '--') + k)
+        if v is not None:
+            args.append(str(v))
+
+    if solver_name == 'cbc':
+        return ' '.join(args) + ' '
+    return ' ' + ' '.join(args)
+
+def memory_solver_dir(shm='/dev/shm'):
+    # LP and solution files in a RAM-backed tmpfs never touch the disk,
+    # but count towards the memory of the job
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return tempfile.mkdtemp(prefix='pypsa-', dir=shm)
+    logger.warning("No RAM-backed tmpfs at {}, writing LP files to the default temporary directory".format(shm))
+    return tempfile.mkdtemp(prefix='pypsa-')
+
+@contextmanager
+def lopf_timer(record, solver_name):
+    """Time writing the LP and solving it inside n.lopf by wrapping the
+    corresponding functions of pypsa.linopf and store the results in record."""
+
+    import pypsa.linopf as linopf
+
+    def timed(name, func):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            res = func(*args, **kwargs)
+            record[name] = time.time() - start
+            if name == 'prepare':
+                record['lp_size_mb'] = os.path.getsize(res[1])/1e6
+            return res
+        return wrapper
+
+    originals = {'prepare_lopf': linopf.prepare_lopf,
+                 'run_and_read_' + solver_name: getattr(linopf, 'run_and_read_' + solver_name)}
+    linopf.prepare_lopf = timed('prepare', originals['prepare_lopf'])
+    setattr(linopf, 'run_and_read_' + solver_name,
+            timed('solve', originals['run_and_read_' + solver_name]))
+    try:
+        yield record
+    finally:
+        for name, func in originals.items():
+            setattr(linopf, name, func)
+
+def prepare_network(n, solve_opts=None, config=None, wildcards=None):
+    if config is None:
+        config = snakemake.config
+    if wildcards is None:
+        wildcards = snakemake.wildcards
     if solve_opts is None:
-        solve_opts = snakemake.config['solving']['options']
+        solve_opts = config['solving']['options']
 
     if 'clip_p_max_pu' in solve_opts:
         for df in (n.generators_t.p_max_pu, n.generators_t.p_min_pu, n.storage_units_t.inflow):
@@ -84,8 +149,8 @@ def prepare_network(n, solve_opts=None):
         n.set_snapshots(n.snapshots[:nhours])
         n.snapshot_weightings[:] = 8760./nhours
 
-    if snakemake.config['foresight']=='myopic':
-        add_land_use_constraint(n)
+    if config['foresight']=='myopic':
+        add_land_use_constraint(n, wildcards.planning_horizons)
 
     return n
 
@@ -108,9 +173,9 @@ def add_opts_constraints(n, opts=None):
         n.model.safe_peakdemand = pypsa.opt.Constraint(expr=sum(n.model.generator_p_nom[gen] for gen in ext_gens_i) >= peakdemand - exist_conv_caps)
 
 
-def add_biofuel_constraint(n):
+def add_biofuel_constraint(n, sector_opts):
 
-    opts = snakemake.wildcards.sector_opts.split('-')
+    opts = sector_opts.split('-')
     print('Options: ', opts)
 
     liquid_biofuel_limit = 0
@@ -141,7 +206,8 @@ def add_eps_storage_constraint(n):
 
 def add_battery_constraints(n):
 
-    chargers = n.links.index[n.links.carrier.str.contains("battery charger") & n.links.p_nom_extendable]
+    chargers = n.links.index[contains(get_component_index(n, "Link").carrier, "battery charger")
+                             & n.links.p_nom_extendable]
     dischargers = chargers.str.replace("charger","discharger")
 
     link_p_nom = get_var(n, "Link", "p_nom")
@@ -155,12 +221,11 @@ def add_battery_constraints(n):
 
 def add_chp_constraints(n):
 
-    electric_bool = (n.links.index.str.contains("urban central")
-                     & n.links.index.str.contains("CHP")
-                     & n.links.index.str.contains("electric"))
-    heat_bool = (n.links.index.str.contains("urban central")
-                 & n.links.index.str.contains("CHP")
-                 & n.links.index.str.contains("heat"))
+    index = get_component_index(n, "Link")
+    electric_bool = ((index.heat_system == "urban central")
+                     & contains(index.technology, "CHP", "electric"))
+    heat_bool = ((index.heat_system == "urban central")
+                 & contains(index.technology, "CHP", "heat"))
 
     electric = n.links.index[electric_bool]
     heat = n.links.index[heat_bool]
@@ -220,26 +285,26 @@ def add_chp_constraints(n):
 
         define_constraints(n, lhs, "<=", n.links.loc[electric_fix,"p_nom"].values, 'chplink', 'top_iso_fuel_line_fix')
 
-def add_land_use_constraint(n):
+def add_land_use_constraint(n, planning_horizons):
 
     #warning: this will miss existing offwind which is not classed AC-DC and has carrier 'offwind'
     for carrier in ['solar', 'onwind', 'offwind-ac', 'offwind-dc']:
         existing_capacities = n.generators.loc[n.generators.carrier==carrier,"p_nom"].groupby(n.generators.bus.map(n.buses.location)).sum()
-        existing_capacities.index += " " + carrier + "-" + snakemake.wildcards.planning_horizons
+        existing_capacities.index += " " + carrier + "-" + planning_horizons
         n.generators.loc[existing_capacities.index,"p_nom_max"] -= existing_capacities
 
     n.generators.p_nom_max[n.generators.p_nom_max<0]=0.
 
-def extra_functionality(n, snapshots):
+def extra_functionality(n, snapshots, sector_opts):
     #add_opts_constraints(n, opts)
     #add_eps_storage_constraint(n)
     add_chp_constraints(n)
     add_battery_constraints(n)
 
-    opts = snakemake.wildcards.sector_opts.split('-')
+    opts = sector_opts.split('-')
     for o in opts:
         if "B" in o:
-            add_biofuel_constraint(n)
+            add_biofuel_constraint(n, sector_opts)
 
 
 def fix_branches(n, lines_s_nom=None, links_p_nom=None):
@@ -252,16 +317,35 @@ def fix_branches(n, lines_s_nom=None, links_p_nom=None):
         # n.links.loc[links_p_nom.index,"p_nom_extendable"] = True
         n.links.loc[links_p_nom.index,"p_nom_extendable"] = False
 
-def solve_network(n, config=None, solver_log=None, opts=None):
+def solve_network(n, config=None, solver_log=None, opts=None, timings=None, sector_opts=None):
     if config is None:
         config = snakemake.config['solving']
+    if sector_opts is None:
+        sector_opts = snakemake.wildcards.sector_opts
     solve_opts = config['options']
 
+    # timings of each run of lopf are appended to the list timings
+    if timings is None:
+        timings = []
+
+    lp_in_memory = config.get('lp_in_memory', False)
+    if lp_in_memory:
+        solver_dir = memory_solver_dir()
+        # free the memory also if solving fails
+        atexit.register(shutil.rmtree, solver_dir, True)
+    else:
+        solver_dir = config.get('tmpdir')
+
     solver_options = config['solver'].copy()
     if solver_log is None:
         solver_log = snakemake.log.solver
     solver_name = solver_options.pop('name')
 
+    # the problem structure does not change between the iterations over the
+    # line parameters, so the basis of the previous run is a valid start
+    warmstart = solve_opts.get('warmstart', False) and n.lines.s_nom_extendable.any()
+    warmstart_solver_options = dict(solver_options, **solve_opts.get('warmstart_solver_options', {}))
+
     def run_lopf(n, allow_warning_status=False, fix_zero_lines=False, fix_ext_lines=False):
         free_output_series_dataframes(n)
 
@@ -301,19 +385,39 @@ def solve_network(n, config=None, solver_log=None, opts=None):
         #sys.exit()
 
 
-        status, termination_condition = n.lopf(pyomo=False,
-                                               solver_name=solver_name,
-                                               solver_logfile=solver_log,
-                                               solver_options=solver_options,
-                                               solver_dir=tmpdir, 
-                                               extra_functionality=extra_functionality,
-                                               formulation=solve_opts['formulation'],
-                                               keep_shadowprices=True,
-                                               keep_references=True,
-                                               keep_files=True)
-                                               # extra_postprocessing=extra_postprocessing)
-                                               #keep_files=True
-                                               #free_memory={'pypsa'}
+        if warmstart and hasattr(n, 'basis_fn'):
+            logger.info("Warm-starting from the basis of the previous run {}".format(n.basis_fn))
+            options = warmstart_solver_options
+            basis_fn = n.basis_fn
+        else:
+            options = solver_options
+            basis_fn = False
+
+        start = time.time()
+        with lopf_timer(dict(run=len(timings)+1, solver_dir=solver_dir), solver_name) as record:
+            status, termination_condition = n.lopf(pyomo=False,
+                                                   solver_name=solver_name,
+                                                   solver_logfile=solver_log,
+                                                   solver_options=format_solver_options(solver_name, options),
+                                                   solver_dir=solver_dir,
+                                                   extra_functionality=partial(extra_functionality, sector_opts=sector_opts),
+                                                   formulation=solve_opts['formulation'],
+                                                   keep_shadowprices=True,
+                                                   keep_references=True,
+                                                   keep_files=not lp_in_memory,
+                                                   warmstart=basis_fn,
+                                                   store_basis=warmstart)
+                                                   # extra_postprocessing=extra_postprocessing)
+                                                   #free_memory={'pypsa'}
+        record['total'] = time.time() - start
+        timings.append(record)
+
+        logger.info("Solving took {:.1f} seconds, of which {:.1f} seconds for writing "
+                    "the LP and {:.1f} seconds for reading and solving it"
+                    .format(record['total'], record.get('prepare', np.nan), record.get('solve', np.nan)))
+
+        if basis_fn and os.path.isfile(basis_fn) and basis_fn != getattr(n, 'basis_fn', None):
+            os.remove(basis_fn)
 
         assert status == "ok" or allow_warning_status and status == 'warning', \
             ("network_lopf did abort with status={} "
@@ -403,6 +507,13 @@ def solve_network(n, config=None, solver_log=None, opts=None):
     # if len(zero_links_i):
     #     n.mremove("Link", zero_links_i)
 
+    if hasattr(n, 'basis_fn'):
+        if os.path.isfile(n.basis_fn):
+            os.remove(n.basis_fn)
+        del n.basis_fn
+
+    if lp_in_memory:
+        shutil.rmtree(solver_dir, ignore_errors=True)
 
     return n
 
@@ -431,13 +542,17 @@ if __name__ == "__main__":
 
     with memory_logger(filename=getattr(snakemake.log, 'memory', None), interval=30.) as mem:
 
-        n = pypsa.Network(snakemake.input.network,
-                          override_component_attrs=override_component_attrs)
+        n = load_network(snakemake.input.network,
+                         override_component_attrs=override_component_attrs)
 
         n = prepare_network(n)
 
-        n = solve_network(n)
+        timings = []
+        n = solve_network(n, timings=timings)
+
+        export_network(n, snakemake.output[0], snakemake.config['network_io'])
 
-        n.export_to_netcdf(snakemake.output[0])
+    if getattr(snakemake.log, 'io', None) is not None:
+        pd.DataFrame(timings).set_index('run').to_csv(snakemake.log.io)
 
     logger.info("Maximum memory usage: {}".format(mem.mem_usage))
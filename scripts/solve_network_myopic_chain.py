@@ -0,0 +1,178 @@
+"""Solve all planning horizons of a myopic run in a single process.
+
+Instead of one add_brownfield and one solve_network job per planning
+horizon, which read the previous solved network back from its netcdf,
+the solved network of each horizon is kept in memory and its surviving
+assets are added to the network of the next horizon with add_brownfield.
+
+The datasets of the solved networks are written by a background thread
+while the next horizon is solved. They are first written as checkpoints named after
+the hash of all inputs up to their horizon, so that a run which failed
+after some horizons resumes from the last solved one. The checkpoints
+are moved to the outputs once all horizons are solved.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import pypsa
+
+from vresutils import Dict
+from vresutils.benchmark import memory_logger
+
+import solve_network as sn
+import add_brownfield as ab
+from add_existing_baseyear import add_build_year_to_new_assets
+from frame_cache import make_key
+from network_io import network_dataset, write_dataset, input_series, load_network
+
+
+# the component attributes of both solve_network and add_brownfield
+override_component_attrs = pypsa.descriptors.Dict({k : v.copy() for k,v in sn.override_component_attrs.items()})
+for k, attrs in ab.override_component_attrs.items():
+    override_component_attrs[k] = pd.concat([override_component_attrs[k],
+                                             attrs.loc[attrs.index.difference(override_component_attrs[k].index)]])
+
+
+def horizon_wildcards(wildcards, year):
+    """The wildcards of the job of a single horizon."""
+
+    wildcards = Dict(wildcards.items())
+    wildcards["planning_horizons"] = str(year)
+    return wildcards
+
+
+def checkpoint_keys(networks, config, sector_opts):
+    """Keys of the solved networks of all horizons, each from the
+    prepared network of its horizon and the key of the previous one."""
+
+    settings = {k : config[k] for k in ["solving", "existing_capacities"]}
+    settings["solving"] = {k : v for k, v in settings["solving"].items()
+                           if k not in ["tmpdir", "mem", "myopic_chain"]}
+    settings["sector_opts"] = sector_opts
+
+    keys = []
+    for year, fn in networks.items():
+        keys.append(make_key([fn], dict(settings, year=year,
+                                        previous=keys[-1] if keys else None)))
+    return keys
+
+
+def start_export(executor, n, fn, config):
+    """Write n to fn with executor. The dataset of n is built in this
+    thread, as a copy of its data which n can be modified after, so that
+    only compressing and writing it runs in the background. The copy is
+    held in memory until it is written."""
+
+    ds, encoding = network_dataset(n, config)
+    return executor.submit(write_dataset, ds, encoding, fn)
+
+
+def solve_chain(networks, checkpoints, snakemake, timings):
+
+    years = list(networks)
+
+    # resume after the horizons solved before, whose checkpoints exist
+    start = 0
+    while start < len(years) and os.path.isfile(checkpoints[start]):
+        start += 1
+
+    if start > 0:
+        logger.info("Resuming after planning horizon {} from {}".format(years[start-1], checkpoints[start-1]))
+
+    n_p = None
+    exports = []
+    # the pending checkpoints are written before an error of a later
+    # horizon is raised, so that the run resumes after them
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for i in range(start, len(years)):
+            year = years[i]
+            logger.info("Solving planning horizon {}".format(year))
+
+            n = load_network(networks[year],
+                             override_component_attrs=override_component_attrs)
+
+            if i > 0 and n_p is None:
+                n_p = load_network(checkpoints[i-1], components=ab.brownfield_components,
+                                   series=input_series(n, ab.brownfield_components),
+                                   override_component_attrs=override_component_attrs)
+
+            if n_p is not None:
+                add_build_year_to_new_assets(n, year)
+                # removes assets from n_p, whose dataset is written from a copy
+                ab.add_brownfield(n, n_p, year,
+                                  snakemake.config['existing_capacities']['threshold_capacity'])
+            del n_p
+
+            n = sn.prepare_network(n, config=snakemake.config,
+                                   wildcards=horizon_wildcards(snakemake.wildcards, year))
+
+            horizon_timings = []
+            n = sn.solve_network(n, config=snakemake.config['solving'],
+                                 solver_log=snakemake.log.solver[i],
+                                 sector_opts=snakemake.wildcards.sector_opts,
+                                 timings=horizon_timings)
+            timings.extend(dict(t, planning_horizon=year) for t in horizon_timings)
+
+            exports.append(start_export(executor, n, checkpoints[i], snakemake.config['network_io']))
+            n_p = n
+
+    # raises the errors of writing the checkpoints
+    for export in exports:
+        export.result()
+
+
+if __name__ == "__main__":
+    # Detect running outside of snakemake and mock snakemake for testing
+    if 'snakemake' not in globals():
+        from vresutils.snakemake import MockSnakemake
+        years = [2020, 2030, 2040, 2050]
+        snakemake = MockSnakemake(
+            wildcards=dict(network='elec', simpl='', clusters='37', lv='1.0',
+                           opts='', sector_opts='Co2L0-168H-T-H-B-I-solar3-dist1'),
+            input=dict(network_base="results/test/prenetworks-brownfield/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_2020.nc",
+                       networks=["results/test/prenetworks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_" + str(year) + ".nc"
+                                 for year in years[1:]]),
+            output=["results/test/postnetworks/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_" + str(year) + ".nc"
+                    for year in years],
+            log=dict(solver=["results/test/logs/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_" + str(year) + "_solver.log"
+                             for year in years],
+                     python="results/test/logs/elec_s{simpl}_{clusters}_lv{lv}_{opts}_{sector_opts}_myopic_python.log")
+        )
+        import yaml
+        with open('config.myopic.yaml', encoding='utf8') as f:
+            snakemake.config = yaml.safe_load(f)
+
+    tmpdir = snakemake.config['solving'].get('tmpdir')
+    if tmpdir is not None:
+        sn.patch_pyomo_tmpdir(tmpdir)
+
+    logging.basicConfig(filename=snakemake.log.python,
+                        level=snakemake.config['logging_level'])
+
+    years = snakemake.config['scenario']['planning_horizons']
+    networks = dict(zip(years, [snakemake.input.network_base] + list(snakemake.input.networks)))
+
+    directory = snakemake.config['solving']['myopic_chain']['checkpoint_dir']
+    os.makedirs(directory, exist_ok=True)
+    checkpoints = [os.path.join(directory, key + ".nc") for key in
+                   checkpoint_keys(networks, snakemake.config, snakemake.wildcards.sector_opts)]
+
+    timings = []
+    with memory_logger(filename=getattr(snakemake.log, 'memory', None), interval=30.) as mem:
+        solve_chain(networks, checkpoints, snakemake, timings)
+
+    # the checkpoint directory may be on another file system
+    for checkpoint, fn in zip(checkpoints, snakemake.output):
+        shutil.move(checkpoint, fn)
+
+    if getattr(snakemake.log, 'io', None) is not None and timings:
+        pd.DataFrame(timings).set_index(['planning_horizon', 'run']).to_csv(snakemake.log.io)
+
+    logger.info("Maximum memory usage: {}".format(mem.mem_usage))
@@ -0,0 +1,145 @@
+"""Bulk construction of PyPSA networks.
+
+Adding components one ``madd`` call at a time re-aligns and concatenates the
+static and time-varying component DataFrames on every call, which becomes
+slow for large sector-coupled networks. ``StagedNetwork`` wraps a
+``pypsa.Network`` and collects components passed to ``add`` and ``madd`` in
+buffers. They are imported with a single call per component and time-varying
+attribute as soon as any other attribute of the network is accessed, so that
+code reading or modifying the network always sees all components added before.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import pandas as pd
+import numpy as np
+
+from six import iteritems
+
+
+class StagedNetwork(object):
+
+    # attributes which can be read without materialising staged components
+    _passthrough = ["snapshots", "snapshot_weightings", "components"]
+
+    def __init__(self, network):
+        self.__dict__["network"] = network
+        self.__dict__["_static"] = {}
+        self.__dict__["_series"] = {}
+        self.__dict__["_names"] = {}
+
+    def madd(self, class_name, names, suffix='', **kwargs):
+        """Stage multiple components, same signature as pypsa.Network.madd."""
+
+        n = self.network
+
+        if class_name not in n.components:
+            logger.error("Component class {} not found".format(class_name))
+            return None
+
+        if not isinstance(names, pd.Index):
+            names = pd.Index(names)
+
+        new_names = names.astype(str) + suffix
+
+        static = {}; series = {}
+        for k, v in iteritems(kwargs):
+            if isinstance(v, pd.DataFrame):
+                series[k] = v.rename(columns=lambda i: str(i)+suffix)
+            elif isinstance(v, pd.Series):
+                static[k] = v.rename(lambda i: str(i)+suffix)
+            elif isinstance(v, np.ndarray) and v.shape == (len(n.snapshots), len(names)):
+                series[k] = pd.DataFrame(v, index=n.snapshots, columns=new_names)
+            else:
+                static[k] = v
+
+        self._stage(class_name, pd.DataFrame(static, index=new_names), series)
+
+        return new_names
+
+    def add(self, class_name, name, **kwargs):
+        """Stage a single component, same signature as pypsa.Network.add."""
+
+        n = self.network
+
+        assert class_name in n.components, "Component class {} not found".format(class_name)
+
+        name = str(name)
+        assert name not in self._existing(class_name), "Failed to add {} component {} because there is already an object with this name in {}".format(class_name, name, n.components[class_name]["list_name"])
+
+        attrs = n.components[class_name]["attrs"]
+
+        static = {}; series = {}
+        for k, v in iteritems(kwargs):
+            if k not in attrs.index:
+                logger.warning("{} has no attribute {}, ignoring this passed value.".format(class_name,k))
+                continue
+            typ = attrs.at[k, "typ"]
+            if not attrs.at[k,"varying"]:
+                static[k] = typ(v)
+            elif attrs.at[k,"static"] and not isinstance(v, (pd.Series, pd.DataFrame, np.ndarray, list)):
+                static[k] = typ(v)
+            else:
+                series[k] = pd.DataFrame({name: pd.Series(data=v, index=n.snapshots, dtype=typ)})
+
+        self._stage(class_name, pd.DataFrame(static, index=[name]), series)
+
+    def _existing(self, class_name):
+        """Return the names of the imported and staged components of
+        class_name, collected once per flush."""
+
+        if class_name not in self._names:
+            self._names[class_name] = set(self.network.df(class_name).index)
+        return self._names[class_name]
+
+    def _stage(self, class_name, static, series):
+
+        names = self._existing(class_name)
+        if static.index.has_duplicates or any(name in names for name in static.index):
+            # like pypsa, the static attributes of the call are not added,
+            # but its time-varying attributes are
+            logger.error("Error, new components for {} are not unique".format(class_name))
+        else:
+            names.update(static.index)
+
+            # fill defaults per call, so that attributes missing in some
+            # calls are not left as NaN when the buffers are concatenated
+            attrs = self.network.components[class_name]["attrs"]
+            static_attrs = attrs[attrs.static].drop("name")
+            for k in static_attrs.index.difference(static.columns):
+                static[k] = static_attrs.at[k, "default"]
+
+            self._static.setdefault(class_name, []).append(static)
+
+        for k, v in iteritems(series):
+            self._series.setdefault((class_name, k), []).append(v)
+
+    def flush(self):
+        """Import all staged components into the network."""
+
+        n = self.network
+
+        # buses and carriers first, so that bus references can be checked
+        class_names = sorted(self._static, key=lambda c: ["Carrier", "Bus"].index(c)
+                             if c in ["Carrier", "Bus"] else 2)
+
+        for class_name in class_names:
+            n.import_components_from_dataframe(pd.concat(self._static[class_name], sort=False),
+                                               class_name)
+
+        for (class_name, attr), dfs in iteritems(self._series):
+            n.import_series_from_dataframe(pd.concat(dfs, axis=1, sort=False), class_name, attr)
+
+        self._static.clear()
+        self._series.clear()
+        self._names.clear()
+
+    def __getattr__(self, attr):
+        if attr not in self._passthrough:
+            self.flush()
+        return getattr(self.network, attr)
+
+    def __setattr__(self, attr, value):
+        self.flush()
+        setattr(self.network, attr, value)
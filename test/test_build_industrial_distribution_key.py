@@ -0,0 +1,102 @@
+"""The Hotmaps facilities are parsed and assigned to buses as by the
+previous implementation, which parsed each geometry with shapely and
+queried one KD-tree per country."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely import wkt, prepared
+from shapely.geometry import box
+from scipy.spatial import cKDTree as KDTree
+
+import build_industrial_distribution_key as bidk
+
+
+def reference_hotmaps_database(fn, europe_shape):
+
+    df = pd.read_csv(fn, sep=";", index_col=0)
+    df.drop(df.index[df.geom.isna()], inplace=True)
+    df["Coordinates"] = df.geom.apply(lambda x : wkt.loads(x[x.find(";POINT")+1:]))
+    gdf = gpd.GeoDataFrame(df, geometry='Coordinates')
+
+    europe_shape_prepped = prepared.prep(europe_shape)
+    gdf.drop(gdf.index[~gdf.geometry.apply(europe_shape_prepped.contains)], inplace=True)
+
+    gdf["country_code"] = gdf.Country.map({"Germany" : "DE", "France" : "FR",
+                                           "Belgium" : "BE", "Malta" : "MA"})
+    gdf["x"] = gdf.geometry.x
+    gdf["y"] = gdf.geometry.y
+    return gdf
+
+
+def reference_buses(gdf, buses):
+
+    bus = pd.Series("", gdf.index)
+    for c in buses.country.unique():
+        buses_i = buses.index[buses.country == c]
+        kdtree = KDTree(buses.loc[buses_i, ['x','y']].values)
+        industry_i = gdf.index[(gdf.country_code == c)]
+        if not industry_i.empty:
+            bus[industry_i] = buses_i[kdtree.query(gdf.loc[industry_i, ['x','y']].values)[1]]
+    return bus
+
+
+def make_hotmaps_inputs(tmp_path):
+    rng = np.random.RandomState(0)
+
+    # buses of neighbouring countries close to the borders at x = 5 and 10,
+    # so that the closest bus is often one of another country
+    buses = pd.DataFrame({"x" : np.r_[rng.uniform(0, 5, 20), rng.uniform(5, 10, 20), rng.uniform(10, 15, 3)],
+                          "y" : rng.uniform(40, 50, 43),
+                          "country" : ["FR"]*20 + ["DE"]*20 + ["BE"]*3})
+    buses.index = buses.country + "0 " + buses.groupby("country").cumcount().astype(str)
+
+    countries = rng.choice(["France", "Germany", "Belgium", "Malta", "Atlantis"], 300)
+    x = rng.uniform(-2, 17, 300)
+    y = rng.uniform(38, 52, 300)
+    geom = pd.Series(["SRID=4326;POINT({} {})".format(*xy) for xy in zip(x, y)])
+    geom[rng.rand(300) < 0.05] = np.nan
+    hotmaps = pd.DataFrame({"geom" : geom, "Country" : countries,
+                            "Subsector" : "Cement", "Emissions_ETS_2014" : 1.})
+    hotmaps.index.name = "SiteID"
+
+    fn = str(tmp_path / "hotmaps.csv")
+    hotmaps.to_csv(fn, sep=";")
+
+    europe_shape = box(-1, 39, 16, 51)
+    europe_fn = str(tmp_path / "europe.geojson")
+    gpd.GeoDataFrame(geometry=[europe_shape]).to_file(europe_fn, driver="GeoJSON")
+
+    return buses, fn, europe_fn, europe_shape
+
+
+def test_hotmaps_parity(tmp_path, monkeypatch):
+    buses, fn, europe_fn, europe_shape = make_hotmaps_inputs(tmp_path)
+
+    # the globals of the script
+    monkeypatch.setattr(bidk, "snakemake",
+                        SimpleNamespace(input=SimpleNamespace(hotmaps_industrial_database=fn,
+                                                              europe_shape=europe_fn)),
+                        raising=False)
+    monkeypatch.setattr(bidk, "n", SimpleNamespace(buses=buses), raising=False)
+
+    gdf = bidk.prepare_hotmaps_database()
+    reference = reference_hotmaps_database(fn, europe_shape)
+
+    pd.testing.assert_index_equal(gdf.index, reference.index)
+    np.testing.assert_array_equal(gdf.x.values, reference.x.values)
+    np.testing.assert_array_equal(gdf.y.values, reference.y.values)
+    pd.testing.assert_series_equal(gdf.country_code, reference.country_code)
+
+    bidk.assign_buses(gdf)
+    expected = reference_buses(gdf, buses)
+
+    pd.testing.assert_series_equal(gdf.bus, expected, check_names=False)
+    # the inputs have facilities assigned across borders, of a country
+    # without buses and of an unknown country
+    nearest = buses.index[KDTree(buses[['x','y']].values).query(gdf[['x','y']].values)[1]]
+    assert ((gdf.bus != "") & (gdf.bus != nearest)).any()
+    assert (gdf.bus[gdf.country_code == "MA"] == "").all()
+    assert (gdf.bus[gdf.country_code.isna()] == "").all()
@@ -0,0 +1,98 @@
+"""The profiles converted in a single pass over the cutout equal those of
+cutout.heat_demand, cutout.temperature, cutout.soil_temperature and
+cutout.solar_thermal for each population layout, as built before."""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+import scipy.sparse
+import pytest
+
+atlite = pytest.importorskip("atlite")
+
+import helper
+import build_weather_profiles as bwp
+
+
+def make_cutout(cutout_dir):
+    """Write a prepared cutout of two months on a small grid with random
+    weather data and return it."""
+
+    rng = np.random.RandomState(0)
+    x = np.arange(5., 8.5, 0.5)
+    y = np.arange(52., 49.5, -0.5)
+    time = pd.date_range("2013-01-01", "2013-02-28 23:00", freq="H")
+
+    coords = {"x" : x, "y" : y, "lon" : ("x", x), "lat" : ("y", y)}
+    meta = xr.Dataset({"height" : (("y", "x"), rng.rand(len(y), len(x)))},
+                      coords=dict(coords, time=time, year=[2013], month=[1, 2]),
+                      attrs={"module" : "ncep"})
+    directory = cutout_dir / "cutout"
+    directory.mkdir()
+    meta.to_netcdf(directory / "meta.nc")
+
+    shape = (len(y), len(x))
+    for month in [1, 2]:
+        t = time[time.month == month]
+        hour = t.hour.values[:, None, None]
+        # no irradiation at night
+        sun = np.clip(np.sin((hour - 6.)/12.*np.pi), 0., None)
+        influx_toa = 1200.*sun*np.ones((1,) + shape)
+        direct = influx_toa*rng.uniform(0., 0.6, (len(t),) + shape)
+        diffuse = (influx_toa - direct)*rng.uniform(0., 0.5, (len(t),) + shape)
+        dims = ("time", "y", "x")
+        ds = xr.Dataset({"temperature" : (dims, 273.15 + rng.uniform(-10., 25., (len(t),) + shape)),
+                         "soil temperature" : (dims, 273.15 + rng.uniform(0., 10., (len(t),) + shape)),
+                         "influx_toa" : (dims, influx_toa),
+                         "influx_direct" : (dims, direct),
+                         "influx_diffuse" : (dims, diffuse),
+                         "albedo" : (dims, rng.uniform(0.1, 0.3, (len(t),) + shape))},
+                        coords=dict(coords, time=t))
+        ds.to_netcdf(directory / "2013{:0>2}.nc".format(month))
+
+    return atlite.Cutout("cutout", cutout_dir=str(cutout_dir), years=slice(2013, 2013),
+                         months=slice(1, 2))
+
+
+def make_layout_inputs(cutout):
+    """Return an indicator matrix of regions, their index and population
+    layouts on the grid of cutout."""
+
+    rng = np.random.RandomState(1)
+    ny, nx = cutout.shape
+    I = scipy.sparse.random(6, ny*nx, density=0.3, random_state=rng, format="csr")
+    index = pd.Index(["DE0 {}".format(i) for i in range(6)], name="name")
+    pop_layouts = {item : xr.DataArray(rng.rand(ny, nx)*(rng.rand(ny, nx) > 0.2),
+                                       coords={"y" : cutout.coords["y"].values,
+                                               "x" : cutout.coords["x"].values},
+                                       dims=["y", "x"])
+                   for item in bwp.items}
+    return I, index, pop_layouts
+
+
+def test_weather_profiles_parity(tmp_path):
+    cutout = make_cutout(tmp_path)
+    I, index, pop_layouts = make_layout_inputs(cutout)
+
+    matrices = {normed : scipy.sparse.vstack([helper.population_weighted_matrix(I, pop_layouts[item], normed=normed).T
+                                              for item in bwp.items]).tocsr()
+                for normed in [False, True]}
+    results = bwp.convert_profiles(cutout, matrices, index)
+
+    for item in bwp.items:
+        M = helper.population_weighted_matrix(I, pop_layouts[item])
+        M_tilde = helper.population_weighted_matrix(I, pop_layouts[item], normed=True)
+        expected = {"heat_demand" : cutout.heat_demand(matrix=M.T, index=index),
+                    "temp_air" : cutout.temperature(matrix=M_tilde.T, index=index),
+                    "temp_soil" : cutout.soil_temperature(matrix=M_tilde.T, index=index),
+                    "solar_thermal" : cutout.solar_thermal(clearsky_model="simple",
+                                                           orientation={'slope': bwp.solar_thermal_angle,
+                                                                        'azimuth': 180.},
+                                                           matrix=M_tilde.T, index=index)}
+
+        for name, reference in expected.items():
+            result = results[name, item]
+            assert result.dims == reference.dims
+            assert (reference != 0.).any()
+            np.testing.assert_allclose(result.transpose(*reference.dims).values,
+                                       reference.values, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,55 @@
+"""The component index stored by export_network is restored by
+load_network without parsing the names again, and equals the index of
+the exported network."""
+
+import numpy as np
+import pandas as pd
+import pypsa
+
+import component_index
+from component_index import get_component_index, add_component_index
+from network_io import export_network, load_network
+
+
+def make_network():
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2013-01-01", periods=3, freq="H"))
+
+    nodes = pd.Index(["DE0 0", "FR0 0"])
+    n.madd("Bus", nodes, carrier="AC")
+    n.madd("Bus", nodes, suffix=" urban central heat", carrier="urban central heat")
+    n.add("Bus", "EU gas", carrier="gas")
+
+    n.madd("Link", nodes, suffix=" urban central gas CHP electric-2030",
+           bus0="EU gas", bus1=nodes, carrier="urban central gas CHP electric")
+    n.madd("Link", nodes, suffix=" urban central air heat pump",
+           bus0=nodes, bus1=nodes + " urban central heat", carrier="urban central air heat pump",
+           efficiency=pd.DataFrame(np.full((3, 2), 3.), n.snapshots, nodes + " urban central air heat pump"))
+    n.add("Link", "H2 pipeline DE0 0 -> FR0 0", bus0="DE0 0", bus1="FR0 0")
+    n.madd("Generator", nodes, suffix=" onwind-2020", bus=nodes, carrier="onwind")
+    n.add("Store", "EU gas Store", bus="EU gas")
+    return n
+
+
+def test_index_is_restored(tmp_path, monkeypatch):
+    n = make_network()
+    fn = str(tmp_path / "network.nc")
+    export_network(n, fn)
+    expected = {c : get_component_index(n, c) for c in ["Bus", "Link", "Generator", "Store"]}
+
+    def parse_names(names):
+        raise AssertionError("names parsed after loading")
+
+    monkeypatch.setattr(component_index, "parse_names", parse_names)
+
+    for kwargs in [{}, dict(components=["Bus", "Link"], series={"Link" : []})]:
+        m = load_network(fn, **kwargs)
+        for c, index in expected.items():
+            if m.df(c).empty:
+                continue
+            pd.testing.assert_frame_equal(get_component_index(m, c), index, check_names=False)
+
+        # the columns for grouping are added from the restored index
+        add_component_index(m)
+        assert list(m.links.technology) == list(expected["Link"].technology)
+        assert list(m.links.location) == list(expected["Link"].location)
@@ -0,0 +1,46 @@
+"""population_weighted_matrix gives the same matrices as the previous
+dense products."""
+
+import numpy as np
+import scipy.sparse
+import xarray as xr
+
+from helper import population_weighted_matrix
+
+
+def make_indicator_inputs():
+    rng = np.random.RandomState(0)
+
+    ny, nx, regions = 20, 30, 40
+    I = scipy.sparse.random(regions, ny*nx, density=0.05, random_state=rng, format="csr")
+    # regions without cells and cells without population
+    I[[3, 17], :] = 0.
+    I.eliminate_zeros()
+
+    pop = rng.rand(ny, nx)*(rng.rand(ny, nx) > 0.2)
+    pop_layout = xr.DataArray(pop, coords={"y" : np.arange(ny), "x" : np.arange(nx)}, dims=["y", "x"])
+
+    return I, pop_layout
+
+
+def test_population_weighted_matrix_parity():
+    I, pop_layout = make_indicator_inputs()
+
+    reference = I.T.dot(np.diag(I.dot(pop_layout.stack(spatial=('y', 'x')))))
+
+    M = population_weighted_matrix(I, pop_layout)
+    assert scipy.sparse.issparse(M)
+    np.testing.assert_array_equal(M.toarray(), reference)
+
+
+def test_normed_population_weighted_matrix_parity():
+    I, pop_layout = make_indicator_inputs()
+
+    M = I.T.dot(np.diag(I.dot(pop_layout.stack(spatial=('y', 'x')))))
+    nonzero_sum = M.sum(axis=0, keepdims=True)
+    nonzero_sum[nonzero_sum == 0.] = 1.
+    reference = M/nonzero_sum
+
+    M_tilde = population_weighted_matrix(I, pop_layout, normed=True)
+    assert scipy.sparse.issparse(M_tilde)
+    np.testing.assert_allclose(M_tilde.toarray(), reference, rtol=1e-15)
@@ -0,0 +1,99 @@
+"""generate_periodic_profiles and aggregate_snapshots give the same
+results as the previous implementations, which converted the snapshots
+once per node and resampled a copy of the network."""
+
+import numpy as np
+import pandas as pd
+import pytz
+import pypsa
+import pytest
+
+import prepare_sector_network as psn
+
+
+def reference_periodic_profiles(dt_index, nodes, weekly_profile):
+
+    weekly_profile = pd.Series(weekly_profile,range(24*7))
+
+    week_df = pd.DataFrame(index=dt_index,columns=nodes)
+
+    for ct in nodes:
+        week_df[ct] = [24*dt.weekday()+dt.hour for dt in dt_index.tz_convert(pytz.timezone(psn.timezone_mappings[ct[:2]]))]
+        week_df[ct] = week_df[ct].map(weekly_profile)
+
+    return week_df
+
+
+def test_periodic_profiles_parity(monkeypatch):
+    # read from data/timezone_mappings.csv in the script
+    monkeypatch.setattr(psn, "timezone_mappings",
+                        pd.Series({"DE" : "Europe/Berlin", "GB" : "Europe/London",
+                                   "PT" : "Europe/Lisbon", "GR" : "Europe/Athens",
+                                   "FI" : "Europe/Helsinki"}),
+                        raising=False)
+
+    # both changes of summer time and the turn of the year
+    dt_index = pd.date_range("2012-12-20", "2013-11-01", freq="H", tz="UTC")
+    nodes = ["DE0 0", "GB0 0", "DE0 1", "PT0 0", "GR0 0", "FI0 0", "GB0 1"]
+    weekly_profile = np.random.RandomState(0).rand(24*7)
+
+    profiles = psn.generate_periodic_profiles(dt_index, nodes, weekly_profile)
+    reference = reference_periodic_profiles(dt_index, nodes, weekly_profile)
+
+    pd.testing.assert_frame_equal(profiles, reference.astype(float))
+
+
+def reference_average_every_nhours(n, offset):
+
+    m = n.copy(with_time=False)
+
+    snapshot_weightings = n.snapshot_weightings.resample(offset).sum()
+    m.set_snapshots(snapshot_weightings.index)
+    m.snapshot_weightings = snapshot_weightings
+
+    for c in n.iterate_components():
+        pnl = getattr(m, c.list_name+"_t")
+        for k, df in c.pnl.items():
+            if not df.empty:
+                if c.list_name == "stores" and k == "e_max_pu":
+                    pnl[k] = df.resample(offset).min()
+                elif c.list_name == "stores" and k == "e_min_pu":
+                    pnl[k] = df.resample(offset).max()
+                else:
+                    pnl[k] = df.resample(offset).mean()
+
+    return m
+
+
+def make_network(hours):
+    rng = np.random.RandomState(0)
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2013-01-01", periods=hours, freq="H"))
+    n.snapshot_weightings[:] = rng.uniform(0.5, 1.5, hours)
+
+    nodes = pd.Index(["DE0 0", "FR0 0", "PL0 0"])
+    n.madd("Bus", nodes)
+    p_max_pu = pd.DataFrame(rng.rand(hours, 3), n.snapshots, nodes + " onwind")
+    p_max_pu.iloc[5, 1] = np.nan
+    n.madd("Generator", nodes + " onwind", bus=nodes, p_max_pu=p_max_pu)
+    n.madd("Load", nodes, bus=nodes, p_set=pd.DataFrame(rng.rand(hours, 3), n.snapshots, nodes))
+    n.madd("Store", nodes + " battery", bus=nodes,
+           e_max_pu=pd.DataFrame(rng.rand(hours, 3), n.snapshots, nodes + " battery"),
+           e_min_pu=pd.DataFrame(0.1*rng.rand(hours, 3), n.snapshots, nodes + " battery"))
+    return n
+
+
+@pytest.mark.parametrize("hours, offset", [(48, "3H"), (50, "24H")])
+def test_average_every_nhours_parity(hours, offset):
+    reference = reference_average_every_nhours(make_network(hours), offset)
+    # a small block size to stack and split several series per block
+    n = make_network(hours)
+    first = (pd.Series(np.arange(len(n.snapshots)), index=n.snapshots)
+             .resample(offset).first().dropna())
+    n = psn.aggregate_snapshots(n, first.index, first.values.astype(int), max_block_size=2*len(n.snapshots))
+
+    pd.testing.assert_index_equal(n.snapshots, reference.snapshots)
+    pd.testing.assert_series_equal(n.snapshot_weightings, reference.snapshot_weightings)
+    for c in reference.iterate_components():
+        for k, df in c.pnl.items():
+            pd.testing.assert_frame_equal(n.pnl(c.name)[k], df, check_freq=False, check_names=False)
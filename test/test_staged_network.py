@@ -0,0 +1,99 @@
+"""The components staged by StagedNetwork equal those added to a plain
+network with pypsa.Network.madd and add."""
+
+import numpy as np
+import pandas as pd
+import pypsa
+import pytest
+
+from staged_network import StagedNetwork
+
+
+def network():
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2013-01-01", periods=4, freq="H"))
+    return n
+
+
+def build(n):
+    """Add the same components to n, a network or a staged network."""
+
+    rng = np.random.RandomState(0)
+    nodes = pd.Index(["DE0 0", "FR0 0", "PL0 0"])
+
+    n.madd("Bus", nodes, carrier="AC", x=pd.Series([1., 2., 3.], nodes))
+    n.madd("Bus", nodes, suffix=" H2", carrier="H2", location=nodes)
+    n.add("Bus", "EU gas", carrier="gas")
+    n.add("Carrier", "onwind")
+
+    n.madd("Generator", nodes, suffix=" onwind",
+           bus=nodes, carrier="onwind", p_nom_extendable=True,
+           capital_cost=pd.Series([1., 2., 3.], nodes),
+           p_max_pu=pd.DataFrame(rng.rand(4, 3), n.snapshots, nodes))
+    n.madd("Generator", nodes, suffix=" solar",
+           bus=nodes, carrier="solar", p_nom=10.,
+           p_max_pu=rng.rand(4, 3))
+    n.add("Generator", "EU gas", bus="EU gas", marginal_cost=20.,
+          p_max_pu=[0.5, 0.6, 0.7, 0.8])
+
+    n.madd("Link", nodes, suffix=" electrolysis",
+           bus0=nodes, bus1=nodes + " H2", efficiency=0.7,
+           p_nom_extendable=True)
+    n.madd("Load", nodes, bus=nodes,
+           p_set=pd.DataFrame(rng.rand(4, 3), n.snapshots, nodes))
+    n.add("Load", "EU gas", bus="EU gas", p_set=pd.Series(1., n.snapshots))
+    n.add("Store", "DE0 0 H2 Store", bus="DE0 0 H2", e_nom=5., e_cyclic=True)
+
+    return n
+
+
+def test_staged_equals_unstaged():
+    reference = build(network())
+    staged = StagedNetwork(network())
+    build(staged)
+    staged.flush()
+    n = staged.network
+
+    for c in reference.iterate_components():
+        pd.testing.assert_frame_equal(n.df(c.name).sort_index(axis=1),
+                                      c.df.sort_index(axis=1), check_names=False)
+        for attr, df in c.pnl.items():
+            pd.testing.assert_frame_equal(n.pnl(c.name)[attr].sort_index(axis=1),
+                                          df.sort_index(axis=1), check_names=False)
+
+
+def test_reading_flushes():
+    n = StagedNetwork(network())
+    n.madd("Bus", ["a", "b"])
+    assert list(n.buses.index) == ["a", "b"]
+    assert not n._static
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_duplicates_as_pypsa(existing):
+    reference = network()
+    staged = StagedNetwork(network())
+
+    for n in [reference, staged]:
+        n.madd("Bus", ["a", "b"])
+        n.madd("Generator", ["a"], bus="a")
+        if existing and n is staged:
+            n.flush()
+
+        n.madd("Generator", ["b", "a"], bus=["b", "a"],
+               p_max_pu=pd.DataFrame(0.5, n.snapshots, ["b", "a"]))
+        n.madd("Bus", ["c", "c"])
+        with pytest.raises(AssertionError):
+            n.add("Bus", "a")
+
+    staged.flush()
+    n = staged.network
+    for c in reference.iterate_components():
+        pd.testing.assert_frame_equal(n.df(c.name).sort_index(axis=1),
+                                      c.df.sort_index(axis=1), check_names=False)
+        for attr, df in c.pnl.items():
+            pd.testing.assert_frame_equal(n.pnl(c.name)[attr].sort_index(axis=1),
+                                          df.sort_index(axis=1), check_names=False)
+    assert not n.generators_t.p_max_pu.empty
+    assert list(n.generators.index) == ["a"]
+    assert list(n.buses.index) == ["a", "b"]